@@ -1,21 +1,51 @@
-from fastapi  import FastAPI,Body
+from fastapi  import FastAPI,Query
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel,Field
-from main  import model_output , new_img
-from utils.image import resolve_images,resolve_new_img
-from utils.presentation_maker import create_elegant_slide, create_title_slide, ColorPalette
-from fastapi.responses import FileResponse
-from pptx import Presentation
-from pptx.util import Inches, Pt
+from pydantic import BaseModel,Field,TypeAdapter
+from typing import List, Optional, Union
+from main  import amodel_output , amodel_output_parallel, anew_img, astream_slides, astream_deck, generation_version
+from components.prompt_and_parser import presentation, Slide
+from utils.cache import response_cache, export_cache, make_key
+from utils.singleflight import deck_flights, SingleFlight
+from utils.metrics import metrics
+from utils.jobs import job_store
+from components.scheduler import RateLimitExceeded, request_budget, DEFAULT_BUDGET, JOB_BUDGET
+from components.llm_model import scheduler, scheduler2, fallback_scheduler
+from components.resilience import latency
+from fastapi import Request
+from contextlib import asynccontextmanager
+from utils.http import open_clients, close_clients
+from utils.image_cache import image_cache
+from utils.image import resolve_images,resolve_image,get_src,pick_rendition,fetch_images,FALLBACK_IMAGE,MAX_CONCURRENT_LOOKUPS
+from utils.image_variants import frame_pixels
+from utils.presentation_maker import build_presentation, presentation_bytes, theme_template, theme_version, IMAGE_INCHES, EXPORT_BUILDER
+from utils.image_variants import EXPORT_IMAGE_DPI, EXPORT_IMAGE_QUALITY, EXPORT_IMAGE_FORMAT, has_variant, seed_variant
+from utils.ooxml_writer import stream_presentation, slide_templates, render_entry, render_deck, slide_parts
+from utils.export_pool import export_pool, ExportQueueFull
+from starlette.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
+from utils.serialization import FastJSONResponse, decode_body, body_schema
 
 
 
 
-import uuid
+import json
+import hashlib
+import asyncio
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app:FastAPI):
+    open_clients()
+    await run_in_threadpool(theme_template)
+    await run_in_threadpool(slide_templates)
+    await export_pool.start()
+    yield
+    export_pool.shutdown()
+    await close_clients()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 
 
 
@@ -28,6 +58,34 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def set_request_budget(request:Request, call_next):
+    try:
+        budget = float(request.headers.get("x-request-budget", DEFAULT_BUDGET))
+    except ValueError:
+        budget = DEFAULT_BUDGET
+    request_budget.set(budget)
+    return await call_next(request)
+
+
+@app.exception_handler(ExportQueueFull)
+async def export_queue_full(request:Request, exc:ExportQueueFull):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(max(1, round(exc.retry_after)))}
+    )
+
+
+@app.exception_handler(RateLimitExceeded)
+async def rate_limited(request:Request, exc:RateLimitExceeded):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(max(1, round(exc.retry_after)))}
+    )
+
+
 class UserResponse(BaseModel):
    title:str = Field(...,description="Title of presentation")
    description:str = Field(...,description="context needed to build")
@@ -40,53 +98,317 @@ class UserResponse(BaseModel):
 class newImage(BaseModel):
      title:str = Field(...,description="title of the current slide")
 
+
+class ExportSlide(Slide):
+     image:Optional[str] = Field(None,description="image url shown next to the points")
+     subtitle:str = Field("",description="subtitle on the entry's title slide")
+     author:str = Field("",description="author on the entry's title slide")
+
+     def entry(self, subtitle:str = "", author:str = ""):
+          return {
+               **self.model_dump(exclude={"image_src"}),
+               "subtitle": self.subtitle or subtitle,
+               "author": self.author or author,
+          }
+
+
+class ExportDeck(BaseModel):
+     slides:List[ExportSlide] = Field(...,description="one title and one content slide per entry")
+     subtitle:str = Field("",description="subtitle for entries that do not set their own")
+     author:str = Field("",description="author for entries that do not set their own")
+
+     def entries(self):
+          return [slide.entry(self.subtitle, self.author) for slide in self.slides]
+
+
+# a bare list of slides is still accepted for older clients
+export_payload = TypeAdapter(Union[ExportDeck, List[ExportSlide]])
+
+
+async def export_entries(request:Request):
+     deck = await decode_body(request, export_payload)
+     if isinstance(deck, list):
+          deck = ExportDeck(slides=deck)
+     return deck.entries()
+
+
+async def build_deck(payload:dict, mode:str, progress=None):
+       key = make_key(payload, *generation_version(mode))
+       cached = await response_cache.aget(key)
+       if cached is not None:
+              return presentation.model_validate(cached)
+
+       async def report(stage):
+              if progress is not None:
+                     await progress(stage)
+
+       async def generate():
+              await report("generating")
+              if mode == "parallel":
+                     response = await amodel_output_parallel(payload)
+              else:
+                     response = await amodel_output(payload)
+              await report("resolving_images")
+              response.content = await resolve_images(response.content)
+
+              await response_cache.aset(key, response.model_dump())
+              return response
+
+       response = await deck_flights.do(key, generate)
+       return response.model_copy(deep=True)
+
+
 @app.post(path='/generate/response')
-async def generate_response(payload:UserResponse):
-       response = model_output(payload.model_dump())
-       response.content = await resolve_images(response.content)
+async def generate_response(payload:UserResponse, mode:str = Query("single", pattern="^(single|parallel)$")):
+       response = await build_deck(payload.model_dump(), mode)
+       return  FastJSONResponse(response)
+
+
+background_jobs = set()
+
+
+async def run_job(job_id:str, payload:dict, mode:str):
+       # jobs have nobody waiting on the connection, so they may queue much longer than a request
+       request_budget.set(JOB_BUDGET)
+       await job_store.aupdate(job_id, status="running")
+       try:
+              response = await build_deck(
+                     payload, mode,
+                     progress=lambda stage: job_store.aupdate(job_id, stage=stage)
+              )
+              await job_store.aupdate(job_id, status="done", stage="done", result=response.model_dump())
+       except Exception as e:
+              await job_store.aupdate(job_id, status="failed", error=str(e))
+
+
+@app.post(path='/generate/jobs', status_code=202)
+async def create_job(payload:UserResponse, mode:str = Query("single", pattern="^(single|parallel)$")):
+       job = await job_store.acreate()
+       task = asyncio.create_task(run_job(job["id"], payload.model_dump(), mode))
+       background_jobs.add(task)
+       task.add_done_callback(background_jobs.discard)
+       return {"id": job["id"], "status": job["status"]}
+
+
+@app.get(path='/generate/jobs/{job_id}')
+async def get_job(job_id:str):
+       job = await job_store.aget(job_id)
+       if job is None:
+              raise HTTPException(status_code=404, detail="job not found")
+       return FastJSONResponse(job)
+
+
+@app.get(path='/cache/stats')
+async def cache_stats():
+       return {**response_cache.stats(), "export": export_cache.stats()}
+
+
+@app.get(path='/metrics')
+async def get_metrics():
+       return {
+              **metrics.snapshot(),
+              "scheduler": {s.model: s.stats() for s in (scheduler, scheduler2, fallback_scheduler)},
+              "latency": {name: hist.stats() for name, hist in latency.items()},
+              "image_cache": image_cache.stats(),
+              "export_pool": export_pool.stats(),
+              "slide_cache": slide_parts.stats(),
+       }
+
+
+def sse_event(event:str, data:dict):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post(path='/generate/stream')
+async def generate_stream(payload:UserResponse):
+    queue = asyncio.Queue()
+
+    async def image_for(index:int, query:str):
+        src = await get_src(query)
+        await queue.put(sse_event("image", {
+            "index": index, "image": pick_rendition(src) or FALLBACK_IMAGE, "image_src": src
+        }))
+
+    async def produce():
+        image_tasks = []
+        try:
+            async for index, slide in astream_slides(payload.model_dump()):
+                await queue.put(sse_event("slide", {"index": index, "slide": slide.model_dump()}))
+                query = slide.image or slide.title
+                image_tasks.append(asyncio.create_task(image_for(index, query)))
+            await asyncio.gather(*image_tasks)
+            await queue.put(sse_event("done", {"slides": len(image_tasks)}))
+        except Exception as e:
+            await queue.put(sse_event("error", {"detail": str(e)}))
+        finally:
+            for task in image_tasks:
+                task.cancel()
+            queue.put_nowait(None)
+
+    async def events():
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                yield item
+        finally:
+            producer.cancel()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
-       return  response
- 
 @app.post(path='/regenerate/img')
 async def generate_new_img(payload:newImage):
-     response = new_img(payload.model_dump())
-     response.query = await resolve_new_img(response.query)
-     return response
-
-@app.post(path='/export/ppt')
-def export(payload: list = Body(...)):
-    prs = Presentation()
-    prs.slide_width = Inches(10)
-    prs.slide_height = Inches(7.5)
-    
-    for slide in payload:
-
-        create_title_slide(
-            prs,
-            title=slide.get("title", "Presentation"),
-            subtitle=slide.get("subtitle", ""),
-            author=slide.get("author", "")
-        )
-
-        create_elegant_slide(prs, slide)
-    
-    filename = f"/tmp/{uuid.uuid4()}.pptx"
-    prs.save(filename)
-    
-    return FileResponse(
-        path=filename,
-        media_type="application/vnd.openxmlformats-officedocument.presentationml.presentation",
-        filename="download_presentation.pptx"
+     response = await anew_img(payload.model_dump())
+     response.src = await get_src(response.query)
+     response.query = pick_rendition(response.src)
+     return FastJSONResponse(response)
+
+PPTX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.presentationml.presentation"
+
+
+export_flights = SingleFlight()
+
+
+def export_key(payload:list, engine:str):
+    return make_key(
+        {"slides": payload},
+        engine, EXPORT_BUILDER, theme_version(),
+        EXPORT_IMAGE_DPI, EXPORT_IMAGE_QUALITY, EXPORT_IMAGE_FORMAT
+    )
+
+
+def etag_matches(request:Request, etag:str):
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]
+
+
+def export_response(request:Request, etag:str, content:bytes):
+    headers = {
+        "Content-Disposition": 'attachment; filename="download_presentation.pptx"',
+        "ETag": etag,
+        "Cache-Control": "private, no-cache",
+    }
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(content=content, media_type=PPTX_MEDIA_TYPE, headers=headers)
+
+
+async def fetch_export_images(payload:list):
+    return await fetch_images(
+        (slide.get("image") for slide in payload), size=frame_pixels(IMAGE_INCHES)
     )
-    
-    
 
-     
 
-     
-     
-     
+async def prepare_export_images(images:dict):
+    # the stream engine's pillow work runs in the export pool; render_entry then finds the variants cached
+    size = frame_pixels(IMAGE_INCHES)
+    missing = {url: content for url, content in images.items() if not has_variant(content, size)}
+    if export_pool.workers <= 0 or not missing:
+        return
+    variants = await export_pool.prepare(missing, size)
+    for url, variant in variants.items():
+        if variant:
+            seed_variant(images[url], size, variant)
+
+
+@app.post(path='/export/ppt', openapi_extra=body_schema(export_payload))
+async def export(request:Request, engine:str = Query("pptx", pattern="^(pptx|stream)$")):
+    payload = await export_entries(request)
+    key = await run_in_threadpool(export_key, payload, engine)
+    cached = export_cache.get(key)
+    if cached is not None:
+        return export_response(request, *cached)
+
+    async def build():
+        images = await fetch_export_images(payload)
+        if engine == "stream":
+            await prepare_export_images(images)
+            # parts are rendered before the zip is assembled, so a render error is a proper error status
+            content = await run_in_threadpool(assemble_presentation, payload, images)
+        elif export_pool.workers > 0:
+            content = await export_pool.render(payload, images)
+        else:
+            content = await run_in_threadpool(render_presentation, payload, images)
+        etag = f'"{hashlib.sha256(content).hexdigest()}"'
+        export_cache.set(key, etag, content)
+        return etag, content
+
+    etag, content = await export_flights.do(key, build)
+    return export_response(request, etag, content)
+
+
+def render_presentation(payload:list, images:dict):
+    return presentation_bytes(build_presentation(payload, images))
+
+
+def assemble_presentation(payload:list, images:dict):
+    rendered = render_deck(payload, images)
+    return b"".join(stream_presentation(payload, rendered=rendered))
+
+
+async def pipeline_deck(key:str, payload:dict):
+    size = frame_pixels(IMAGE_INCHES)
+    templates = slide_templates()
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_LOOKUPS)
+
+    async def prepare(slide, resolve=True):
+        # each slide is looked up, downloaded and rendered as soon as the model finishes it
+        if resolve:
+            await resolve_image(slide, semaphore)
+        entry = ExportSlide.model_validate(slide.model_dump()).entry()
+        fetched = await fetch_images([slide.image], size=size)
+        try:
+            await prepare_export_images(fetched)
+        except ExportQueueFull:
+            # a generation already spent tens of seconds on the model; encode locally rather than fail it
+            metrics.inc("export_pool.local_fallbacks")
+        parts = await run_in_threadpool(render_entry, templates, entry, fetched.get(slide.image), size)
+        return slide, entry, parts
+
+    tasks = []
+    try:
+        cached = await response_cache.aget(key)
+        if cached is not None:
+            for slide in presentation.model_validate(cached).content:
+                tasks.append(asyncio.create_task(prepare(slide, resolve=False)))
+        else:
+            async for index, slide in astream_deck(payload):
+                tasks.append(asyncio.create_task(prepare(slide)))
+        prepared = await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+    if cached is None:
+        await response_cache.aset(key, presentation(content=[slide for slide, _, _ in prepared]).model_dump())
+
+    entries = [entry for _, entry, _ in prepared]
+    export = export_key(entries, "stream")
+    hit = export_cache.get(export)
+    if hit is not None:
+        return hit
+
+    # every slide part is already rendered, so this only assembles the zip
+    rendered = [parts for _, _, parts in prepared]
+    content = await run_in_threadpool(lambda: b"".join(stream_presentation(entries, rendered=rendered)))
+    etag = f'"{hashlib.sha256(content).hexdigest()}"'
+    export_cache.set(export, etag, content)
+    return etag, content
+
 
-  
-    
\ No newline at end of file
+@app.post(path='/generate/deck')
+async def generate_deck(request:Request, payload:UserResponse):
+    data = payload.model_dump()
+    key = make_key(data, *generation_version("stream"))
+    etag, content = await deck_flights.do(key, lambda: pipeline_deck(key, data))
+    return export_response(request, etag, content)
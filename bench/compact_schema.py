@@ -0,0 +1,101 @@
+# output tokens of the full deck schema against the compact short-key schema, e.g.
+#   python -m bench.compact_schema            fixed decks re-encoded in both wire formats, no network
+#   python -m bench.compact_schema --live     calls groq, needs GROQ_API_KEY
+import os
+import json
+import asyncio
+import argparse
+import statistics
+
+os.environ.setdefault("GROQ_API_KEY", "bench")
+
+from langchain_core.runnables import RunnableSequence
+
+from main import chain_input
+from components.llm_model import mymodel
+from components.prompt_and_parser import myprompt, compact_prompt
+
+
+TOPICS = [
+    ("Photosynthesis", ["Light reactions", "Calvin cycle", "Chlorophyll", "Stomata", "Glucose"]),
+    ("Quarterly results", ["Revenue by region", "Churn", "Hiring", "Margins", "Outlook", "Risks", "Cash flow", "Summary"]),
+    ("Intro to Kubernetes", ["Pods", "Services", "Deployments", "ConfigMaps", "Secrets", "Ingress",
+                             "Autoscaling", "Namespaces", "Volumes", "Probes", "Helm", "Recap"]),
+]
+
+
+def fixed_deck(topic, titles):
+    # realistic lengths: 3-4 bullets of ~6 words and explanations of ~20 words per slide
+    slides = []
+    for n, title in enumerate(titles):
+        count = 3 + n % 2
+        slides.append({
+            "title": f"{title} in {topic}",
+            "points": [f"Key idea {i + 1} about {title.lower()} explained" for i in range(count)],
+            "explanation": [
+                f"This explains how {title.lower()} shapes {topic.lower()} in practice, with one concrete "
+                f"example the audience can relate to and remember later ({i + 1})."
+                for i in range(count)
+            ],
+            "image": f"{title.lower()} diagram illustration",
+        })
+    return slides
+
+
+def parser_wire(slides):
+    return {"content": slides}
+
+
+def compact_wire(slides):
+    return {"s": [
+        {"t": s["title"], "b": [{"p": p, "e": e} for p, e in zip(s["points"], s["explanation"])], "i": s["image"]}
+        for s in slides
+    ]}
+
+
+def estimate(data, indent):
+    # roughly four characters per token; models usually answer with indented json
+    return len(json.dumps(data, indent=indent, ensure_ascii=False)) // 4
+
+
+def offline():
+    print("estimated output tokens per deck (chars/4)")
+    print(f"{'deck':<22} {'slides':>6} {'parser':>7} {'compact':>8} {'saved':>6}   {'indent=2 parser':>15} {'compact':>8} {'saved':>6}")
+    for topic, titles in TOPICS:
+        slides = fixed_deck(topic, titles)
+        flat = estimate(parser_wire(slides), None), estimate(compact_wire(slides), None)
+        pretty = estimate(parser_wire(slides), 2), estimate(compact_wire(slides), 2)
+        print(
+            f"{topic:<22} {len(slides):>6} {flat[0]:>7} {flat[1]:>8} {1 - flat[1] / flat[0]:>6.0%}   "
+            f"{pretty[0]:>15} {pretty[1]:>8} {1 - pretty[1] / pretty[0]:>6.0%}"
+        )
+
+
+async def live(runs):
+    chains = {"parser": RunnableSequence(myprompt, mymodel), "compact": RunnableSequence(compact_prompt, mymodel)}
+    print(f"mean output tokens over {runs} runs")
+    print(f"{'deck':<22} {'slides':>6} {'parser':>7} {'compact':>8} {'saved':>6}")
+    for topic, titles in TOPICS:
+        inputs = chain_input({
+            "title": topic, "description": ", ".join(titles), "slide": len(titles),
+            "tg": "general audience", "tone": "neutral", "purpose": "inform",
+        })
+        tokens = {}
+        for mode, chain in chains.items():
+            messages = [await chain.ainvoke(inputs) for _ in range(runs)]
+            tokens[mode] = statistics.mean((m.usage_metadata or {}).get("output_tokens", 0) for m in messages)
+        print(
+            f"{topic:<22} {len(titles):>6} {tokens['parser']:>7.0f} {tokens['compact']:>8.0f} "
+            f"{1 - tokens['compact'] / tokens['parser']:>6.0%}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--live", action="store_true")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+    if args.live:
+        asyncio.run(live(args.runs))
+    else:
+        offline()
@@ -0,0 +1,51 @@
+# per-request latency through a fresh client per call versus the shared pooled client, e.g.
+#   python -m bench.http_clients --url https://api.groq.com/openai/v1/models --requests 20
+import time
+import asyncio
+import argparse
+import statistics
+
+import httpx
+
+from utils.http import HTTP2, TIMEOUT, LIMITS
+
+
+async def timed_get(client, url):
+    started = time.perf_counter()
+    await client.get(url)
+    return time.perf_counter() - started
+
+
+async def cold(url, requests):
+    # what every call paid before: DNS, TCP and TLS again each time
+    timings = []
+    for _ in range(requests):
+        async with httpx.AsyncClient(http2=HTTP2, timeout=TIMEOUT) as client:
+            timings.append(await timed_get(client, url))
+    return timings
+
+
+async def warm(url, requests):
+    async with httpx.AsyncClient(http2=HTTP2, timeout=TIMEOUT, limits=LIMITS) as client:
+        await client.get(url)
+        return [await timed_get(client, url) for _ in range(requests)]
+
+
+def summary(name, timings):
+    timings = sorted(timings)
+    p90 = timings[max(0, round(len(timings) * 0.9) - 1)]
+    print(f"{name:>5}  median {statistics.median(timings) * 1000:7.1f}ms  p90 {p90 * 1000:7.1f}ms")
+
+
+async def run(url, requests):
+    print(f"{url}  http2={HTTP2}  requests={requests}")
+    summary("cold", await cold(url, requests))
+    summary("warm", await warm(url, requests))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="https://api.groq.com/openai/v1/models")
+    parser.add_argument("--requests", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.requests))
@@ -0,0 +1,75 @@
+# exported deck size and build time with and without prepare_image, e.g.
+#   python -m bench.image_variants --slides 10 --width 4000
+import io
+import time
+import argparse
+
+from PIL import Image, ImageFilter
+
+import utils.ooxml_writer as ooxml_writer
+import utils.presentation_maker as presentation_maker
+import utils.image_variants as image_variants
+
+
+def photo(seed, width):
+    # noise blurred into soft detail compresses about like a real photo, unlike a flat fill
+    height = width * 2 // 3
+    noise = Image.effect_noise((width // 4, height // 4), 60 + seed % 40).convert("RGB")
+    tint = Image.new("RGB", noise.size, ((seed * 53) % 255, (seed * 97) % 255, (seed * 31) % 255))
+    img = Image.blend(noise, tint, 0.5).resize((width, height), Image.BICUBIC).filter(ImageFilter.DETAIL)
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=90)
+    return out.getvalue()
+
+
+def deck(slides):
+    return [
+        {
+            "title": f"Slide {i}",
+            "points": [f"point {j}" for j in range(3)],
+            "explanation": [f"explanation of point {j} on slide {i}" for j in range(3)],
+            "image": f"photo-{i}",
+        }
+        for i in range(slides)
+    ]
+
+
+def reset():
+    # every run starts cold: no cached variants and no cached slide parts
+    image_variants._variants.clear()
+    ooxml_writer.slide_parts.clear()
+
+
+def export(engine, slides, images):
+    reset()
+    started = time.perf_counter()
+    if engine == "pptx":
+        content = presentation_maker.presentation_bytes(presentation_maker.build_presentation(slides, images))
+    else:
+        content = b"".join(ooxml_writer.stream_presentation(slides, images))
+    return len(content), time.perf_counter() - started
+
+
+def run(count, width):
+    slides = deck(count)
+    images = {slide["image"]: photo(i, width) for i, slide in enumerate(slides)}
+    source = sum(len(content) for content in images.values())
+    print(f"{count} slides, {width}px source photos, {source / 1e6:.1f} MB of images")
+    print(f"{'engine':<7} {'variant':<9} {'bytes':>12} {'seconds':>8}")
+    for engine in ("pptx", "stream"):
+        for label, prepare in (("off", lambda content, size: content), ("on", image_variants.prepare_image)):
+            presentation_maker.prepare_image = prepare
+            ooxml_writer.prepare_image = prepare
+            size, seconds = export(engine, slides, images)
+            print(f"{engine:<7} {label:<9} {size:>12,} {seconds:>8.2f}")
+    presentation_maker.prepare_image = image_variants.prepare_image
+    ooxml_writer.prepare_image = image_variants.prepare_image
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--slides", type=int, default=10)
+    parser.add_argument("--width", type=int, nargs="+", default=[1880, 4000])
+    args = parser.parse_args()
+    for width in args.width:
+        run(args.slides, width)
@@ -0,0 +1,83 @@
+# wall-clock comparison of single-call and outline/fan-out generation against a stub model
+# whose latency is a fixed time to first token plus a per-token cost, e.g.
+#   python -m bench.parallel_generation --slides 5 15 40
+import os
+import json
+import time
+import asyncio
+import argparse
+
+os.environ.setdefault("GROQ_API_KEY", "bench")
+os.environ.setdefault("LLM_OUTPUT_MODE", "parser")
+
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+import main
+from components.prompt_and_parser import Slide, outline, OutlineItem
+
+
+SLIDE_TOKENS = 180
+OUTLINE_TOKENS = 25
+
+
+def slide_data(i):
+    return {
+        "title": f"Slide {i}",
+        "points": [f"point {j}" for j in range(4)],
+        "explanation": [f"explanation {j}" for j in range(4)],
+        "image": "mountain lake",
+    }
+
+
+def stub_model(first_token, per_token):
+    async def generate(tokens):
+        await asyncio.sleep(first_token + tokens * per_token)
+
+    async def deck(inputs):
+        await generate(inputs["slide"] * SLIDE_TOKENS)
+        return AIMessage(content=json.dumps({"content": [slide_data(i) for i in range(inputs["slide"])]}))
+
+    async def plan(inputs):
+        await generate(inputs["slide"] * OUTLINE_TOKENS)
+        return outline(slides=[OutlineItem(title=f"Slide {i}", focus="focus") for i in range(inputs["slide"])])
+
+    async def slide(inputs):
+        await generate(SLIDE_TOKENS)
+        return Slide.model_validate(slide_data(inputs["position"]))
+
+    main.rawchain = RunnableLambda(deck)
+    main.outline_chain = RunnableLambda(plan)
+    main.slide_chain = RunnableLambda(slide)
+
+
+def payload(slides):
+    return {
+        "title": "Benchmark", "description": "stub", "slide": slides,
+        "tg": "engineers", "tone": "neutral", "purpose": "measure",
+    }
+
+
+async def timed(call):
+    started = time.perf_counter()
+    result = await call
+    return time.perf_counter() - started, len(result.content)
+
+
+async def run(sizes):
+    print(f"{'slides':>6}  {'single':>8}  {'parallel':>8}")
+    for slides in sizes:
+        single, _ = await timed(main.amodel_output(payload(slides)))
+        parallel, produced = await timed(main.amodel_output_parallel(payload(slides)))
+        assert produced == slides
+        print(f"{slides:>6}  {single:>7.2f}s  {parallel:>7.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--slides", type=int, nargs="+", default=[5, 15, 40])
+    parser.add_argument("--first-token", type=float, default=0.3)
+    parser.add_argument("--per-token", type=float, default=0.004)
+    args = parser.parse_args()
+    stub_model(args.first_token, args.per_token)
+    asyncio.run(run(args.slides))
@@ -0,0 +1,96 @@
+# input tokens and latency of the parser prompt against provider structured output, e.g.
+#   python -m bench.structured_output            prompt sizes only, no network
+#   python -m bench.structured_output --live     calls groq, needs GROQ_API_KEY
+import os
+import json
+import time
+import asyncio
+import argparse
+import statistics
+
+os.environ.setdefault("GROQ_API_KEY", "bench")
+
+from langchain_core.runnables import RunnableSequence
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from main import chain_input
+from components.llm_model import mymodel, mymodel2
+from components.prompt_and_parser import myprompt, img_prompt, presentation, newImg
+
+
+DECKS = [
+    {"title": "Photosynthesis", "description": "how plants turn light into food", "slide": 5,
+     "tg": "high school students", "tone": "friendly", "purpose": "teach"},
+    {"title": "Quarterly results", "description": "revenue, churn and hiring for Q3", "slide": 8,
+     "tg": "board members", "tone": "formal", "purpose": "report"},
+    {"title": "Intro to Kubernetes", "description": "pods, services and deployments", "slide": 12,
+     "tg": "backend engineers", "tone": "technical", "purpose": "onboard"},
+]
+TITLES = ["Light reactions", "Revenue by region", "Rolling deployments"]
+
+
+def estimate(text):
+    # roughly four characters per token for english prompts and json schemas
+    return len(text) // 4
+
+
+def offline():
+    print("estimated input tokens per call (chars/4)")
+    print(f"{'call':<25} {'parser':>7} {'structured':>11} {'tool':>5} {'saved':>6}")
+    deck_tool = estimate(json.dumps(convert_to_openai_tool(presentation)))
+    for deck in DECKS:
+        inputs = chain_input(deck)
+        parser = estimate(myprompt.format(**inputs))
+        structured = estimate(myprompt.partial(my_format="").format(**inputs))
+        print(f"{deck['title']:<25} {parser:>7} {structured:>11} {deck_tool:>5} {parser - structured - deck_tool:>6}")
+    img_tool = estimate(json.dumps(convert_to_openai_tool(newImg)))
+    for title in TITLES:
+        parser = estimate(img_prompt.format(title=title))
+        structured = estimate(img_prompt.partial(format="").format(title=title))
+        print(f"{'img: ' + title:<25} {parser:>7} {structured:>11} {img_tool:>5} {parser - structured - img_tool:>6}")
+
+
+async def measure(chain, inputs, runs):
+    timings, usage = [], []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = await chain.ainvoke(inputs)
+        timings.append(time.perf_counter() - started)
+        message = result["raw"] if isinstance(result, dict) else result
+        usage.append(message.usage_metadata or {})
+    return (
+        statistics.median(timings),
+        statistics.mean(u.get("input_tokens", 0) for u in usage),
+        statistics.mean(u.get("output_tokens", 0) for u in usage),
+    )
+
+
+async def live(runs):
+    modes = {
+        "parser": (RunnableSequence(myprompt, mymodel), RunnableSequence(img_prompt, mymodel2)),
+        "structured": (
+            RunnableSequence(myprompt.partial(my_format=""), mymodel.with_structured_output(presentation, include_raw=True)),
+            RunnableSequence(img_prompt.partial(format=""), mymodel2.with_structured_output(newImg, include_raw=True)),
+        ),
+    }
+    print(f"median latency and mean usage over {runs} runs")
+    print(f"{'call':<25} {'mode':<11} {'seconds':>8} {'input':>7} {'output':>7}")
+    for deck in DECKS:
+        for mode, (deck_chain, _) in modes.items():
+            seconds, tokens_in, tokens_out = await measure(deck_chain, chain_input(deck), runs)
+            print(f"{deck['title']:<25} {mode:<11} {seconds:>8.2f} {tokens_in:>7.0f} {tokens_out:>7.0f}")
+    for title in TITLES:
+        for mode, (_, img) in modes.items():
+            seconds, tokens_in, tokens_out = await measure(img, {"title": title}, runs)
+            print(f"{'img: ' + title:<25} {mode:<11} {seconds:>8.2f} {tokens_in:>7.0f} {tokens_out:>7.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--live", action="store_true")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+    if args.live:
+        asyncio.run(live(args.runs))
+    else:
+        offline()
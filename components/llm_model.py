@@ -1,16 +1,62 @@
+import os
 from langchain_groq  import ChatGroq
 from dotenv import load_dotenv
+from components.scheduler import ModelScheduler
+from utils.http import groq_clients
 
 load_dotenv()
 
+scheduler = ModelScheduler(
+    "llama-3.3-70b-versatile",
+    requests_per_minute=int(os.getenv("GROQ_RPM", "30")),
+    tokens_per_minute=int(os.getenv("GROQ_TPM", "12000")),
+    max_output_tokens=int(os.getenv("GROQ_EXPECTED_OUTPUT_TOKENS", "1500")),
+)
+
+scheduler2 = ModelScheduler(
+    "openai/gpt-oss-120b",
+    requests_per_minute=int(os.getenv("GROQ_RPM_2", "30")),
+    tokens_per_minute=int(os.getenv("GROQ_TPM_2", "8000")),
+    max_output_tokens=int(os.getenv("GROQ_EXPECTED_OUTPUT_TOKENS_2", "300")),
+)
+
+fallback_scheduler = ModelScheduler(
+    os.getenv("GROQ_FALLBACK_MODEL", "llama-3.1-8b-instant"),
+    requests_per_minute=int(os.getenv("GROQ_RPM_FALLBACK", "30")),
+    tokens_per_minute=int(os.getenv("GROQ_TPM_FALLBACK", "6000")),
+    max_output_tokens=int(os.getenv("GROQ_EXPECTED_OUTPUT_TOKENS", "1500")),
+)
+
+# retries are owned by components.resilience, so the groq clients below use max_retries=0
+GROQ_TIMEOUT = float(os.getenv("GROQ_TIMEOUT", "60"))
+
+client, aclient = groq_clients(scheduler.model, *scheduler.response_hook())
+client2, aclient2 = groq_clients(scheduler2.model, *scheduler2.response_hook())
+client3, aclient3 = groq_clients(fallback_scheduler.model, *fallback_scheduler.response_hook())
+
 mymodel = ChatGroq(
     model="llama-3.3-70b-versatile",
     temperature=0.33,
+    timeout=GROQ_TIMEOUT,
+    max_retries=0,
+    http_client=client,
+    http_async_client=aclient,
 )
 
 mymodel2 = ChatGroq(
     model="openai/gpt-oss-120b",
-    temperature=0.22
+    temperature=0.22,
+    timeout=GROQ_TIMEOUT,
+    max_retries=0,
+    http_client=client2,
+    http_async_client=aclient2,
 )
 
-
+fallback_model = ChatGroq(
+    model=fallback_scheduler.model,
+    temperature=0.33,
+    timeout=GROQ_TIMEOUT,
+    max_retries=0,
+    http_client=client3,
+    http_async_client=aclient3,
+)
@@ -1,6 +1,7 @@
 from langchain_core.prompts import PromptTemplate
 from pydantic  import BaseModel,Field
-from typing  import List
+from typing  import List, Dict, Optional
+from pydantic.json_schema import SkipJsonSchema
 from langchain_core.output_parsers import PydanticOutputParser
 
 
@@ -9,6 +10,8 @@ class Slide(BaseModel):
     points:List[str] = Field(...,description="points discussed in the slide")
     explanation : List[str] = Field(...,description="1-2 line explanation corresponding to each point")
     image:str = Field(...,description= "relevant image query as per the contents of the slide")
+    # filled in server side with every pexels rendition; kept out of the schema the model sees
+    image_src:SkipJsonSchema[Optional[Dict[str,str]]] = None
 
 
 class presentation(BaseModel):
@@ -91,6 +94,7 @@ ABSOLUTE SCHEMA COMPLIANCE:
 
 class newImg(BaseModel):
     query:str = Field(...,description="new image relevant to the query")
+    src:SkipJsonSchema[Optional[Dict[str,str]]] = None
 
 img_parser = PydanticOutputParser(pydantic_object=newImg)
 
@@ -108,4 +112,147 @@ img_prompt = PromptTemplate(
 
     input_variables=["title"],
     partial_variables={"format" : img_parser.get_format_instructions()}
-)
\ No newline at end of file
+)
+
+class OutlineItem(BaseModel):
+    title:str = Field(...,description="Title of the slide")
+    focus:str = Field(...,description="one line describing what the slide covers and how it connects to the flow")
+
+
+class outline(BaseModel):
+    slides:List[OutlineItem] = Field(...,description="ordered outline of the presentation")
+
+
+outline_parser = PydanticOutputParser(pydantic_object=outline)
+
+outline_prompt = PromptTemplate(
+    template="""
+You are an expert AI assistant who plans the structure of presentations.
+
+You will be provided with the following inputs:
+1. Presentation topic: {title}
+2. Description / context: {description}
+3. Number of slides: {slide}
+4. Target audience: {tg}
+5. Tone of presentation: {tone}
+6. Presentation purpose: {purpose}
+
+Produce ONLY the outline of the presentation:
+- EXACTLY {slide} slides, in presentation order.
+- Slide 1 MUST be an introduction.
+- Slide {slide} MUST be a conclusion.
+- For each slide give a clear, concise title and ONE line describing its focus.
+- Follow the presentation {purpose} to determine logical flow.
+- Do NOT write bullet points or explanations.
+- Do not include markdown or natural language outside the schema.
+
+\n{my_format}
+""",
+
+    input_variables= ["title" , "description", "slide" ,"tg", "tone","purpose"],
+
+    partial_variables={"my_format" : outline_parser.get_format_instructions()}
+)
+
+
+slide_parser = PydanticOutputParser(pydantic_object=Slide)
+
+slide_prompt = PromptTemplate(
+    template="""
+You are an expert AI assistant specialized in writing the content of ONE presentation slide
+in a strictly structured format.
+
+Presentation context:
+- Topic: {title}
+- Description / context: {description}
+- Target audience: {tg}
+- Tone: {tone}
+- Purpose: {purpose}
+
+Full outline of the presentation:
+{outline}
+
+You are writing slide {position} of {slide}.
+- Slide title: {slide_title}
+- Slide focus: {slide_focus}
+
+CONTENT RULES:
+- Keep the given slide title.
+- EXACTLY 3 or 4 bullet points, without repeating content from other slides in the outline.
+- For EACH bullet point, provide a 1–2 line explanation clearly expanding that bullet.
+- explanation MUST be a list with the SAME LENGTH as points.
+- One image search query: short (3–6 words), concrete nouns only, no verbs, no punctuation.
+- If specific factual information is not available, use "Information not available".
+- Do not include markdown or natural language outside the schema.
+
+\n{my_format}
+""",
+
+    input_variables= ["title" , "description", "slide" ,"tg", "tone","purpose",
+                      "outline", "position", "slide_title", "slide_focus"],
+
+    partial_variables={"my_format" : slide_parser.get_format_instructions()}
+)
+
+
+class CompactPoint(BaseModel):
+    p:str = Field(...,description="bullet point")
+    e:str = Field(...,description="1-2 line explanation of the bullet point")
+
+
+class CompactSlide(BaseModel):
+    t:str = Field(...,description="slide title")
+    b:List[CompactPoint] = Field(...,description="3 or 4 bullet points with their explanations")
+    i:str = Field(...,description="image query")
+
+    def expand(self):
+        return Slide(
+            title=self.t,
+            points=[item.p for item in self.b],
+            explanation=[item.e for item in self.b],
+            image=self.i
+        )
+
+
+class compactPresentation(BaseModel):
+    s:List[CompactSlide] = Field(...,description="slides")
+
+    def expand(self):
+        return presentation(content=[slide.expand() for slide in self.s])
+
+
+compact_parser = PydanticOutputParser(pydantic_object=compactPresentation)
+
+compact_prompt = PromptTemplate(
+    template="""
+You are an expert AI assistant specialized in generating high-quality presentation content
+in a strictly structured, compact JSON format.
+
+You will be provided with the following inputs:
+1. Presentation topic: {title}
+2. Description / context: {description}
+3. Number of slides: {slide}
+4. Target audience: {tg}
+5. Tone of presentation: {tone}
+6. Presentation purpose: {purpose}
+
+GENERAL RULES:
+- Generate EXACTLY {slide} slides.
+- Slide 1 MUST be an introduction.
+- Slide {slide} MUST be a conclusion.
+- The content must be appropriate for the target audience and tone.
+- Follow the presentation {purpose} to determine logical flow.
+
+OUTPUT FORMAT (short keys, no other fields, no markdown):
+{{"s": [{{"t": "<slide title>", "b": [{{"p": "<bullet point>", "e": "<1-2 line explanation>"}}], "i": "<image query>"}}]}}
+
+CONTENT RULES FOR EACH SLIDE:
+- "t": one clear and concise slide title.
+- "b": EXACTLY 3 or 4 entries; each pairs a bullet point "p" with its explanation "e".
+- "i": image query of 3–6 words, concrete nouns only, no verbs, no punctuation.
+- If specific factual information is not available, use "Information not available" as the explanation.
+- No field may be empty or missing, including on the conclusion slide.
+""",
+
+    input_variables= ["title" , "description", "slide" ,"tg", "tone","purpose"]
+)
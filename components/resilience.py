@@ -0,0 +1,202 @@
+import os
+import time
+import random
+import asyncio
+import threading
+from bisect import bisect_left
+from collections import deque
+from langchain_core.runnables import RunnableLambda
+from utils.metrics import metrics
+
+
+RETRIES = int(os.getenv("LLM_RETRIES", "2"))
+BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "8"))
+HEDGE = os.getenv("LLM_HEDGE", "0") == "1"
+HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+
+BUCKETS = [0.5, 1, 2, 5, 10, 20, 30, 60, 120]
+
+
+class LatencyHistogram:
+    def __init__(self, window=500):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self.counts[bisect_left(BUCKETS, seconds)] += 1
+            self.samples.append(seconds)
+
+    def quantile(self, q):
+        with self._lock:
+            ordered = sorted(self.samples)
+        if not ordered:
+            return None
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def stats(self):
+        labels = [f"le_{b}" for b in BUCKETS] + ["inf"]
+        return {
+            "count": len(self.samples),
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+latency = {}
+
+
+def histogram(name):
+    if name not in latency:
+        latency[name] = LatencyHistogram()
+    return latency[name]
+
+
+def status_of(error):
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+def is_overloaded(error):
+    status = status_of(error)
+    return status is not None and (status == 429 or status >= 500)
+
+
+def is_retryable(error):
+    if is_overloaded(error) or isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    # groq's APIConnectionError / APITimeoutError carry no status code
+    return type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+def backoff(attempt):
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+class Resilient:
+    # the schedulers admit each call before it is timed: queueing for rate-limit capacity must not
+    # count as model latency, nor start the hedge clock while the primary is only waiting its turn
+    def __init__(self, name, primary, fallback=None, fallback_name=None,
+                 retries=RETRIES, hedge=HEDGE, scheduler=None, fallback_scheduler=None):
+        self.name = name
+        self.primary = primary
+        self.fallback = fallback
+        self.fallback_name = fallback_name or f"{name}_fallback"
+        self.retries = retries
+        self.hedge = hedge
+        self.scheduler = scheduler
+        self.fallback_scheduler = fallback_scheduler
+
+    async def _timed(self, name, runnable, value, scheduler=None):
+        if scheduler is not None:
+            value = await scheduler.aacquire(value)
+        started = time.monotonic()
+        result = await runnable.ainvoke(value)
+        histogram(name).record(time.monotonic() - started)
+        return result
+
+    def _timed_sync(self, name, runnable, value, scheduler=None):
+        if scheduler is not None:
+            value = scheduler.acquire(value)
+        started = time.monotonic()
+        result = runnable.invoke(value)
+        histogram(name).record(time.monotonic() - started)
+        return result
+
+    async def _hedged(self, value):
+        delay = histogram(self.name).quantile(0.95)
+        if not self.hedge or delay is None or len(histogram(self.name).samples) < HEDGE_MIN_SAMPLES:
+            return await self._timed(self.name, self.primary, value, self.scheduler)
+
+        if self.scheduler is not None:
+            value = await self.scheduler.aacquire(value)
+        first = asyncio.ensure_future(self._timed(self.name, self.primary, value))
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            return first.result()
+
+        metrics.inc(f"llm.{self.name}.hedges")
+        if self.fallback is not None:
+            second = asyncio.ensure_future(
+                self._timed(self.fallback_name, self.fallback, value, self.fallback_scheduler)
+            )
+        else:
+            second = asyncio.ensure_future(self._timed(self.name, self.primary, value, self.scheduler))
+        pending = {first, second}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            metrics.inc(f"llm.{self.name}.hedge_wins")
+                        return task.result()
+            # both failed: report the primary's error and mark the hedge's as retrieved
+            second.exception()
+            raise first.exception()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def ainvoke(self, value):
+        for attempt in range(self.retries + 1):
+            try:
+                return await self._hedged(value)
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                last = e
+                metrics.inc(f"llm.{self.name}.errors")
+
+            if self.fallback is not None and is_overloaded(last):
+                metrics.inc(f"llm.{self.name}.fallbacks")
+                try:
+                    return await self._timed(self.fallback_name, self.fallback, value, self.fallback_scheduler)
+                except Exception as e:
+                    if not is_retryable(e):
+                        raise
+                    last = e
+
+            if attempt < self.retries:
+                metrics.inc(f"llm.{self.name}.retries")
+                await asyncio.sleep(backoff(attempt))
+        raise last
+
+    def invoke(self, value):
+        for attempt in range(self.retries + 1):
+            try:
+                return self._timed_sync(self.name, self.primary, value, self.scheduler)
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                last = e
+                metrics.inc(f"llm.{self.name}.errors")
+
+            if self.fallback is not None and is_overloaded(last):
+                metrics.inc(f"llm.{self.name}.fallbacks")
+                try:
+                    return self._timed_sync(self.fallback_name, self.fallback, value, self.fallback_scheduler)
+                except Exception as e:
+                    if not is_retryable(e):
+                        raise
+                    last = e
+
+            if attempt < self.retries:
+                metrics.inc(f"llm.{self.name}.retries")
+                time.sleep(backoff(attempt))
+        raise last
+
+    def runnable(self):
+        return RunnableLambda(self.invoke, afunc=self.ainvoke, name=f"{self.name}_resilient")
+
+
+def resilient(name, primary, fallback=None, fallback_name=None, scheduler=None, fallback_scheduler=None):
+    return Resilient(
+        name, primary, fallback, fallback_name,
+        scheduler=scheduler, fallback_scheduler=fallback_scheduler
+    ).runnable()
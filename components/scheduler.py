@@ -0,0 +1,155 @@
+import os
+import re
+import time
+import asyncio
+import threading
+from contextvars import ContextVar
+from langchain_core.runnables import RunnableLambda
+from utils.metrics import metrics
+
+
+DEFAULT_BUDGET = float(os.getenv("LLM_QUEUE_BUDGET", "30"))
+JOB_BUDGET = float(os.getenv("LLM_JOB_QUEUE_BUDGET", "300"))
+
+# longest a single model call of the request being served may queue for admission, set by the app
+request_budget = ContextVar("request_budget", default=None)
+
+
+class RateLimitExceeded(Exception):
+    def __init__(self, model, retry_after):
+        super().__init__(f"{model} is rate limited, retry after {retry_after:.1f}s")
+        self.model = model
+        self.retry_after = retry_after
+
+
+def parse_reset(value):
+    # groq sends durations such as "7.66s", "2m59.56s" or "120ms"
+    if not value:
+        return None
+    total = 0.0
+    for amount, unit in re.findall(r"([\d.]+)(ms|h|m|s)", value):
+        total += float(amount) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[unit]
+    return total
+
+
+class TokenBucket:
+    def __init__(self, capacity, per_seconds=60.0):
+        self.capacity = float(capacity)
+        self.rate = self.capacity / per_seconds
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        self._refill(now)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def take(self, amount):
+        # the level may go negative: later callers then queue behind this reservation
+        self.level -= amount
+
+    def sync(self, remaining, reset, now):
+        self._refill(now)
+        if remaining is not None:
+            self.level = min(self.level, float(remaining))
+        if reset is not None and remaining is not None and remaining <= 0:
+            self.level = min(self.level, -reset * self.rate)
+
+
+class ModelScheduler:
+    def __init__(self, model, requests_per_minute, tokens_per_minute, max_output_tokens):
+        self.model = model
+        self.max_output_tokens = max_output_tokens
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.queued = 0
+        # groq's request headers count requests per day; when they run out nothing is admitted until reset
+        self.daily_exhausted_until = 0.0
+        self._lock = threading.Lock()
+
+    def estimate_tokens(self, prompt):
+        text = prompt.to_string() if hasattr(prompt, "to_string") else str(prompt)
+        return len(text) // 4 + self.max_output_tokens
+
+    def reserve(self, tokens):
+        budget = request_budget.get()
+        if budget is None:
+            budget = DEFAULT_BUDGET
+        now = time.monotonic()
+        with self._lock:
+            wait = max(
+                self.requests.wait_time(1, now),
+                self.tokens.wait_time(tokens, now),
+                self.daily_exhausted_until - now,
+            )
+            if wait > 0 and wait > budget:
+                metrics.inc(f"scheduler.{self.model}.rejected")
+                raise RateLimitExceeded(self.model, wait)
+            self.requests.take(1)
+            self.tokens.take(tokens)
+        metrics.inc(f"scheduler.{self.model}.admitted")
+        metrics.inc(f"scheduler.{self.model}.queue_seconds", wait)
+        return wait
+
+    def acquire(self, prompt):
+        wait = self.reserve(self.estimate_tokens(prompt))
+        if wait > 0:
+            time.sleep(wait)
+        return prompt
+
+    async def aacquire(self, prompt):
+        wait = self.reserve(self.estimate_tokens(prompt))
+        if wait > 0:
+            self.queued += 1
+            try:
+                await asyncio.sleep(wait)
+            finally:
+                self.queued -= 1
+        return prompt
+
+    def observe(self, headers, status_code=200):
+        now = time.monotonic()
+        remaining_requests = headers.get("x-ratelimit-remaining-requests")
+        remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+        with self._lock:
+            # only the token headers are per minute; the request headers are the daily quota
+            if remaining_requests is not None and float(remaining_requests) <= 0:
+                reset = parse_reset(headers.get("x-ratelimit-reset-requests"))
+                if reset is not None:
+                    self.daily_exhausted_until = max(self.daily_exhausted_until, now + reset)
+            if remaining_tokens is not None:
+                self.tokens.sync(
+                    float(remaining_tokens),
+                    parse_reset(headers.get("x-ratelimit-reset-tokens")), now
+                )
+            if status_code == 429:
+                metrics.inc(f"scheduler.{self.model}.upstream_429")
+                retry_after = float(headers.get("retry-after") or 1)
+                self.requests.sync(0, retry_after, now)
+
+    def gate(self):
+        return RunnableLambda(self.acquire, afunc=self.aacquire, name=f"{self.model}_gate")
+
+    def response_hook(self):
+        def hook(response):
+            self.observe(response.headers, response.status_code)
+
+        async def ahook(response):
+            self.observe(response.headers, response.status_code)
+
+        return hook, ahook
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "queued": self.queued,
+                "request_wait": self.requests.wait_time(1, now),
+                "daily_wait": max(0.0, self.daily_exhausted_until - now),
+                "token_level": self.tokens.level,
+            }
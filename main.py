@@ -1,27 +1,380 @@
-from components.llm_model  import mymodel,mymodel2
-from components.prompt_and_parser import myprompt,myparser,img_prompt,img_parser
-from langchain_core.runnables import RunnableSequence
+import os
+import hashlib
+from components.llm_model  import mymodel,mymodel2,scheduler,scheduler2
+from components.llm_model import fallback_model,fallback_scheduler
+from components.resilience import resilient
+from components.prompt_and_parser import myprompt,myparser,img_prompt,img_parser,Slide,presentation,newImg
+from components.prompt_and_parser import outline_prompt,outline_parser,slide_prompt,slide_parser
+from components.prompt_and_parser import compact_prompt,compact_parser,CompactSlide
+from langchain_core.runnables import RunnableSequence, RunnableLambda
+from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.exceptions import OutputParserException
+from langchain_core.utils.json import parse_json_markdown
+from pydantic import ValidationError
+from utils.metrics import metrics
 
-mychain = RunnableSequence(myprompt,mymodel,myparser)
+llm = resilient(
+    scheduler.model,
+    mymodel,
+    fallback_model,
+    fallback_scheduler.model,
+    scheduler=scheduler,
+    fallback_scheduler=fallback_scheduler
+)
 
-chain2 = RunnableSequence(img_prompt ,  mymodel2 ,img_parser)
+llm2 = resilient(scheduler2.model, mymodel2, scheduler=scheduler2)
 
+mychain = RunnableSequence(myprompt,llm,myparser)
 
-def model_output(payload:dict):
-    response = mychain.invoke({
+chain2 = RunnableSequence(img_prompt ,  llm2 ,RunnableLambda(lambda message: record_call_tokens("img_parser", message)),img_parser)
+
+outline_chain = RunnableSequence(outline_prompt,llm,outline_parser)
+
+slide_chain = RunnableSequence(slide_prompt,llm,slide_parser)
+
+# provider-side structured output: the schema travels as a tool definition
+# instead of the format instructions appended to the prompt
+structured_chain = RunnableSequence(myprompt.partial(my_format=""),resilient(
+    f"{scheduler.model}:structured",
+    mymodel.with_structured_output(presentation, include_raw=True),
+    fallback_model.with_structured_output(presentation, include_raw=True),
+    f"{fallback_scheduler.model}:structured",
+    scheduler=scheduler,
+    fallback_scheduler=fallback_scheduler
+),RunnableLambda(lambda result: structured_deck(result)))
+
+structured_chain2 = RunnableSequence(img_prompt.partial(format=""),resilient(
+    f"{scheduler2.model}:structured",
+    mymodel2.with_structured_output(newImg, include_raw=True),
+    scheduler=scheduler2
+),RunnableLambda(lambda result: structured_img(result)))
+
+rawchain = RunnableSequence(myprompt,llm)
+
+compact_rawchain = RunnableSequence(compact_prompt,llm)
+
+# short keys and paired point/explanation objects on the wire, expanded to presentation
+compact_chain = RunnableSequence(compact_prompt,llm,compact_parser,RunnableLambda(lambda deck: deck.expand()))
+
+slide_rawchain = RunnableSequence(slide_prompt,llm)
+
+MAX_CONCURRENT_SLIDES = int(os.getenv("SLIDE_CONCURRENCY", "8"))
+SLIDE_REPAIR_ROUNDS = int(os.getenv("SLIDE_REPAIR_ROUNDS", "2"))
+OUTPUT_MODE = os.getenv("LLM_OUTPUT_MODE", "parser")
+
+
+def deck_chain():
+    if OUTPUT_MODE == "structured":
+        return structured_chain
+    if OUTPUT_MODE == "compact":
+        return compact_chain
+    return mychain
+
+
+def img_chain():
+    return structured_chain2 if OUTPUT_MODE == "structured" else chain2
+
+
+def generation_version(mode:str = "single"):
+    if mode == "parallel":
+        prompts = [outline_prompt.template, slide_prompt.template]
+    elif OUTPUT_MODE == "compact" and mode != "stream":
+        # streaming always goes through the full prompt
+        prompts = [compact_prompt.template]
+    else:
+        prompts = [myprompt.template]
+    digest = hashlib.sha256("\n".join(prompts).encode("utf-8")).hexdigest()[:16]
+    return (mode, OUTPUT_MODE, mymodel.model_name, digest)
+
+
+def chain_input(payload:dict):
+    return {
         "title" : payload['title'],
         "description" : payload['description'],
         "slide" :payload['slide'],
         "tg" : payload['tg'],
         "tone":payload['tone'],
         "purpose" : payload['purpose']
-    })
+    }
+
+
+def model_output(payload:dict):
+    response = deck_chain().invoke(chain_input(payload))
     return response
 
 def new_img(payload:dict):
-    response = chain2.invoke({
+    response = img_chain().invoke({
         "title" : payload['title']
     })
 
     return response
 
+
+async def amodel_output(payload:dict):
+    if OUTPUT_MODE in ("parser", "compact") and SLIDE_REPAIR_ROUNDS > 0:
+        return await amodel_output_tolerant(payload, compact=OUTPUT_MODE == "compact")
+    if OUTPUT_MODE == "compact":
+        message = await compact_rawchain.ainvoke(chain_input(payload))
+        record_tokens("compact", message, payload['slide'])
+        return compact_parser.parse(message.content).expand()
+    response = await deck_chain().ainvoke(chain_input(payload))
+    return response
+
+async def anew_img(payload:dict):
+    response = await img_chain().ainvoke({
+        "title" : payload['title']
+    })
+
+    return response
+
+
+streamchain = RunnableSequence(myprompt,scheduler.gate(),mymodel,JsonOutputParser())
+
+
+async def astream_slides(payload:dict):
+    emitted = 0
+    content = []
+    async for partial in streamchain.astream(chain_input(payload)):
+        if not isinstance(partial, dict):
+            continue
+        content = partial.get("content") or []
+        # every slide except the last one in the partial list is complete
+        while emitted < len(content) - 1:
+            yield emitted, Slide.model_validate(content[emitted])
+            emitted += 1
+
+    while emitted < len(content):
+        yield emitted, Slide.model_validate(content[emitted])
+        emitted += 1
+
+
+async def amodel_output_parallel(payload:dict, concurrency:int = MAX_CONCURRENT_SLIDES):
+    base = chain_input(payload)
+    plan = await outline_chain.ainvoke(base)
+
+    outline_text = "\n".join(
+        f"{i}. {item.title} - {item.focus}" for i, item in enumerate(plan.slides, start=1)
+    )
+    inputs = [
+        {
+            **base,
+            "slide": len(plan.slides),
+            "outline": outline_text,
+            "position": i,
+            "slide_title": item.title,
+            "slide_focus": item.focus,
+        }
+        for i, item in enumerate(plan.slides, start=1)
+    ]
+
+    slides = await slide_chain.abatch(inputs, config={"max_concurrency": concurrency})
+    return presentation(content=slides)
+
+
+def output_tokens(message):
+    usage = getattr(message, "usage_metadata", None) or {}
+    return usage.get("output_tokens", 0)
+
+
+def input_tokens(message):
+    usage = getattr(message, "usage_metadata", None) or {}
+    return usage.get("input_tokens", 0)
+
+
+def record_tokens(mode:str, message, slide_count):
+    metrics.inc(f"tokens.{mode}.decks")
+    metrics.inc(f"tokens.{mode}.slides", slide_count)
+    metrics.inc(f"tokens.{mode}.input", input_tokens(message))
+    metrics.inc(f"tokens.{mode}.output", output_tokens(message))
+
+
+def record_call_tokens(mode:str, message):
+    # image queries are single calls, so they are counted per call rather than per deck
+    metrics.inc(f"tokens.{mode}.calls")
+    metrics.inc(f"tokens.{mode}.input", input_tokens(message))
+    metrics.inc(f"tokens.{mode}.output", output_tokens(message))
+    return message
+
+
+def structured_img(result:dict):
+    query = result["parsed"]
+    if query is None:
+        raise result["parsing_error"] or OutputParserException("model returned no structured image query")
+    record_call_tokens("img_structured", result["raw"])
+    return query
+
+
+def structured_deck(result:dict):
+    # include_raw keeps the provider message so structured decks report usage like the other modes
+    deck = result["parsed"]
+    if deck is None:
+        raise result["parsing_error"] or OutputParserException("model returned no structured deck")
+    record_tokens("structured", result["raw"], len(deck.content))
+    return deck
+
+
+def check_slide(item):
+    try:
+        slide = Slide.model_validate(item)
+    except ValidationError as e:
+        return None, str(e)
+    if not slide.points or len(slide.points) != len(slide.explanation):
+        return None, "explanation must be a list with the SAME LENGTH as points"
+    return slide, None
+
+
+def check_compact_slide(item):
+    try:
+        slide = CompactSlide.model_validate(item).expand()
+    except ValidationError as e:
+        return None, str(e)
+    return check_slide(slide.model_dump())
+
+
+async def amodel_output_tolerant(payload:dict, max_rounds:int = SLIDE_REPAIR_ROUNDS, compact:bool = False):
+    # compact decks are checked slide by slide in their short-key form; repairs use the full slide prompt
+    base = chain_input(payload)
+    message = await (compact_rawchain if compact else rawchain).ainvoke(base)
+    full_tokens = output_tokens(message)
+    record_tokens("compact" if compact else "parser", message, payload['slide'])
+
+    data = parse_json_markdown(message.content)
+    items = data.get("s" if compact else "content", []) if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        raise OutputParserException("model output has no slide content", llm_output=message.content)
+
+    slides = [None] * len(items)
+    broken = {}
+    for i, item in enumerate(items):
+        slides[i], error = (check_compact_slide if compact else check_slide)(item)
+        if error:
+            broken[i] = error
+
+    metrics.inc("repair.decks")
+    if not broken:
+        return presentation(content=slides)
+
+    metrics.inc("repair.decks_repaired")
+    metrics.inc("repair.slides_broken", len(broken))
+    broken_count = len(broken)
+
+    title_key = "t" if compact else "title"
+    titles = [item.get(title_key) if isinstance(item, dict) else None for item in items]
+    outline_text = "\n".join(
+        f"{i}. {title or 'Untitled'}" for i, title in enumerate(titles, start=1)
+    )
+    repair_tokens = 0
+    rounds = 0
+    while broken and rounds < max_rounds:
+        rounds += 1
+        metrics.inc("repair.rounds")
+        indexes = list(broken)
+        inputs = [
+            {
+                **base,
+                "slide": len(items),
+                "outline": outline_text,
+                "position": i + 1,
+                "slide_title": titles[i] or f"Slide {i + 1}",
+                "slide_focus": f"a previous attempt at this slide was invalid ({broken[i]}), write it again",
+            }
+            for i in indexes
+        ]
+        replies = await slide_rawchain.abatch(
+            inputs, config={"max_concurrency": MAX_CONCURRENT_SLIDES}, return_exceptions=True
+        )
+        for i, reply in zip(indexes, replies):
+            if isinstance(reply, Exception):
+                broken[i] = str(reply)
+                continue
+            repair_tokens += output_tokens(reply)
+            try:
+                slide, error = check_slide(parse_json_markdown(reply.content))
+            except (OutputParserException, ValueError) as e:
+                slide, error = None, str(e)
+            if error:
+                broken[i] = error
+            else:
+                slides[i] = slide
+                del broken[i]
+
+    if broken:
+        metrics.inc("repair.failures")
+        raise OutputParserException(
+            f"could not repair slides {sorted(i + 1 for i in broken)} after {rounds} rounds",
+            llm_output=message.content
+        )
+
+    metrics.inc("repair.slides_repaired", broken_count)
+    metrics.inc("repair.output_tokens", repair_tokens)
+    metrics.inc("repair.tokens_saved", max(full_tokens - repair_tokens, 0))
+    return presentation(content=slides)
+
+
+async def arepair_slide(base:dict, total:int, titles:list, index:int, error:str, max_rounds:int = SLIDE_REPAIR_ROUNDS):
+    outline_text = "\n".join(f"{i}. {title or 'Untitled'}" for i, title in enumerate(titles, start=1))
+    for _ in range(max_rounds):
+        metrics.inc("repair.rounds")
+        reply = await slide_rawchain.ainvoke({
+            **base,
+            "slide": total,
+            "outline": outline_text,
+            "position": index + 1,
+            "slide_title": titles[index] or f"Slide {index + 1}",
+            "slide_focus": f"a previous attempt at this slide was invalid ({error}), write it again",
+        })
+        try:
+            slide, error = check_slide(parse_json_markdown(reply.content))
+        except (OutputParserException, ValueError) as e:
+            slide, error = None, str(e)
+        if slide is not None:
+            metrics.inc("repair.slides_repaired")
+            return slide
+    metrics.inc("repair.failures")
+    raise OutputParserException(f"could not repair slide {index + 1}: {error}")
+
+
+async def astream_deck(payload:dict):
+    # astream_slides with the safety nets of amodel_output: an invalid slide is repaired on its own,
+    # and a stream that fails is finished by the resilient (retrying, fallback) deck chain
+    base = chain_input(payload)
+    emitted = 0
+    content = []
+
+    async def complete(index):
+        item = content[index]
+        slide, error = check_slide(item)
+        if error:
+            metrics.inc("repair.slides_broken")
+            titles = [entry.get("title") if isinstance(entry, dict) else None for entry in content]
+            titles += [None] * (payload['slide'] - len(titles))
+            slide = await arepair_slide(base, max(payload['slide'], len(content)), titles, index, error)
+        return slide
+
+    stream = streamchain.astream(base)
+    try:
+        while True:
+            try:
+                partial = await anext(stream)
+            except StopAsyncIteration:
+                break
+            except Exception:
+                metrics.inc("llm.stream_fallbacks")
+                # slides already sent stay; the rest of the deck comes from one resilient call
+                deck = await amodel_output(payload)
+                for index, slide in enumerate(deck.content[emitted:], start=emitted):
+                    yield index, slide
+                return
+            if not isinstance(partial, dict):
+                continue
+            content = partial.get("content") or []
+            # every slide except the last one in the partial list is complete
+            while emitted < len(content) - 1:
+                yield emitted, await complete(emitted)
+                emitted += 1
+    finally:
+        await stream.aclose()
+
+    while emitted < len(content):
+        yield emitted, await complete(emitted)
+        emitted += 1
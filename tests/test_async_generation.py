@@ -0,0 +1,76 @@
+import os
+import json
+import time
+import asyncio
+
+os.environ.setdefault("GROQ_API_KEY", "test")
+os.environ.setdefault("VITE_API_KEY", "test")
+
+import httpx
+from langchain_core.messages import AIMessage
+
+import app
+import main
+from components.prompt_and_parser import presentation
+
+
+MODEL_LATENCY = 0.5
+CONCURRENT_REQUESTS = 8
+
+
+def deck(title):
+    return {"content": [{
+        "title": title,
+        "points": ["first point", "second point", "third point"],
+        "explanation": ["first explanation", "second explanation", "third explanation"],
+        "image": "mountain lake",
+    }]}
+
+
+class SlowModel:
+    async def ainvoke(self, inputs, config=None, **kwargs):
+        await asyncio.sleep(MODEL_LATENCY)
+        return AIMessage(content=json.dumps(deck(inputs["title"])))
+
+
+class SlowDeckChain:
+    async def ainvoke(self, inputs, config=None, **kwargs):
+        await asyncio.sleep(MODEL_LATENCY)
+        return presentation.model_validate(deck(inputs["title"]))
+
+
+async def skip_images(slides):
+    return slides
+
+
+def request_body(i):
+    return {
+        "title": f"Deck {i}", "description": "testing", "slide": 1,
+        "tg": "students", "tone": "formal", "purpose": "teach",
+    }
+
+
+async def generate(count):
+    transport = httpx.ASGITransport(app=app.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        started = time.perf_counter()
+        responses = await asyncio.gather(*(
+            client.post("/generate/response", json=request_body(i)) for i in range(count)
+        ))
+        elapsed = time.perf_counter() - started
+    for response in responses:
+        assert response.status_code == 200, response.text
+    return elapsed
+
+
+def test_concurrent_generations_take_about_one_call(monkeypatch):
+    monkeypatch.setattr(main, "rawchain", SlowModel())
+    monkeypatch.setattr(main, "mychain", SlowDeckChain())
+    monkeypatch.setattr(app, "resolve_images", skip_images)
+    monkeypatch.setattr(app.response_cache, "get", lambda key: None)
+
+    single = asyncio.run(generate(1))
+    many = asyncio.run(generate(CONCURRENT_REQUESTS))
+
+    assert single >= MODEL_LATENCY
+    assert many < single + MODEL_LATENCY, (single, many)
@@ -0,0 +1,89 @@
+import io
+import os
+import asyncio
+import zipfile
+
+os.environ.setdefault("GROQ_API_KEY", "test")
+os.environ.setdefault("VITE_API_KEY", "test")
+
+import httpx
+import pytest
+from PIL import Image
+from pptx import Presentation
+
+import app
+from components.prompt_and_parser import Slide
+from utils.presentation_maker import build_presentation, presentation_bytes
+from utils.ooxml_writer import stream_presentation
+
+
+def jpeg():
+    buffer = io.BytesIO()
+    Image.new("RGB", (800, 600), (20, 90, 200)).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+def slide_data(count, image=None):
+    return {
+        "title": f"{count} points",
+        "points": [f"point {i}" for i in range(count)],
+        "explanation": [f"explanation for point {i} " * 4 for i in range(count)],
+        "image": image,
+    }
+
+
+def slide_parts(content):
+    deck = zipfile.ZipFile(io.BytesIO(content))
+    assert deck.testzip() is None
+    return {name: deck.read(name) for name in deck.namelist() if name.startswith("ppt/slides/slide")}
+
+
+@pytest.mark.parametrize("count", [1, 2, 3, 4])
+def test_both_engines_render_every_point_count(count):
+    images = {"photo": jpeg(), "broken": b"<html>not an image</html>"}
+    escaped = slide_data(count, "photo")
+    escaped["title"] = "esc\x1bchar"
+    escaped["explanation"] = [f"line one\r\nline two {i}" for i in range(count)]
+    slides = [slide_data(count), slide_data(count, "photo"), escaped, slide_data(count, "broken")]
+
+    classic = slide_parts(presentation_bytes(build_presentation(slides, images)))
+    content = b"".join(stream_presentation(slides, images))
+    streamed = slide_parts(content)
+
+    assert len(streamed) == 2 * len(slides)
+    assert streamed == classic
+    assert len(Presentation(io.BytesIO(content)).slides) == 2 * len(slides)
+    # the undecodable image is left out, as python-pptx leaves it out
+    media = [name for name in zipfile.ZipFile(io.BytesIO(content)).namelist() if name.startswith("ppt/media/")]
+    assert len(media) == 1
+
+
+def test_generate_deck_renders_every_point_count(monkeypatch):
+    image = jpeg()
+
+    async def fake_slides(payload):
+        for index, count in enumerate([1, 2, 3, 4]):
+            yield index, Slide.model_validate({**slide_data(count), "image": "query"})
+
+    async def fake_src(query):
+        return {"medium": f"https://images.pexels.com/photos/1/{query}.jpeg"}
+
+    async def fake_fetch(urls, size=None, **kwargs):
+        return {url: image for url in urls if url}
+
+    monkeypatch.setattr(app, "astream_deck", fake_slides)
+    monkeypatch.setattr("utils.image.get_src", fake_src)
+    monkeypatch.setattr(app, "fetch_images", fake_fetch)
+    monkeypatch.setattr(app.response_cache, "get", lambda key: None)
+
+    async def generate():
+        transport = httpx.ASGITransport(app=app.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/generate/deck", json={
+                "title": "Points", "description": "every layout", "slide": 4,
+                "tg": "testers", "tone": "plain", "purpose": "render",
+            })
+
+    response = asyncio.run(generate())
+    assert response.status_code == 200, response.text
+    assert len(slide_parts(response.content)) == 8
@@ -0,0 +1,96 @@
+import os
+import json
+import asyncio
+
+os.environ.setdefault("GROQ_API_KEY", "test")
+
+import pytest
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+import main
+from components.prompt_and_parser import Slide, presentation
+
+
+PAYLOAD = {
+    "title": "Streaming", "description": "partial decks", "slide": 3,
+    "tg": "testers", "tone": "plain", "purpose": "check",
+}
+
+
+def slide_data(title):
+    return {"title": title, "points": ["one", "two", "three"],
+            "explanation": ["first", "second", "third"], "image": "query"}
+
+
+class StubStream:
+    # yields growing partial decks like JsonOutputParser, optionally failing after some of them
+    def __init__(self, items, fail_after=None):
+        self.items = items
+        self.fail_after = fail_after
+
+    async def astream(self, inputs, config=None, **kwargs):
+        for n in range(1, len(self.items) + 1):
+            if self.fail_after is not None and n > self.fail_after:
+                raise ConnectionError("stream dropped")
+            yield {"content": self.items[:n]}
+
+
+def collect(payload=PAYLOAD):
+    async def run():
+        return [(index, slide) async for index, slide in main.astream_deck(payload)]
+    return asyncio.run(run())
+
+
+def test_invalid_slide_is_repaired_alone(monkeypatch):
+    broken = {"title": "Second", "points": ["one"], "explanation": []}
+    monkeypatch.setattr(main, "streamchain", StubStream([slide_data("First"), broken, slide_data("Third")]))
+
+    async def repair(inputs):
+        assert inputs["position"] == 2
+        return AIMessage(content=json.dumps(slide_data(inputs["slide_title"])))
+
+    monkeypatch.setattr(main, "slide_rawchain", RunnableLambda(repair))
+
+    slides = collect()
+    assert [index for index, _ in slides] == [0, 1, 2]
+    assert [slide.title for _, slide in slides] == ["First", "Second", "Third"]
+
+
+def test_stream_failing_before_first_slide_falls_back(monkeypatch):
+    monkeypatch.setattr(main, "streamchain", StubStream([slide_data("First")], fail_after=0))
+
+    async def fallback(payload):
+        return presentation(content=[Slide.model_validate(slide_data(f"Fallback {i}")) for i in range(3)])
+
+    monkeypatch.setattr(main, "amodel_output", fallback)
+
+    slides = collect()
+    assert [slide.title for _, slide in slides] == ["Fallback 0", "Fallback 1", "Fallback 2"]
+
+
+def test_stream_failing_midway_keeps_sent_slides(monkeypatch):
+    items = [slide_data("First"), slide_data("Second"), slide_data("Third")]
+    monkeypatch.setattr(main, "streamchain", StubStream(items, fail_after=2))
+
+    async def fallback(payload):
+        return presentation(content=[Slide.model_validate(slide_data(f"Fallback {i}")) for i in range(3)])
+
+    monkeypatch.setattr(main, "amodel_output", fallback)
+
+    slides = collect()
+    assert [index for index, _ in slides] == [0, 1, 2]
+    assert [slide.title for _, slide in slides] == ["First", "Fallback 1", "Fallback 2"]
+
+
+def test_unrepairable_slide_fails(monkeypatch):
+    broken = {"title": "Broken", "points": [], "explanation": []}
+    monkeypatch.setattr(main, "streamchain", StubStream([broken, slide_data("Second")]))
+
+    async def still_broken(inputs):
+        return AIMessage(content=json.dumps(broken))
+
+    monkeypatch.setattr(main, "slide_rawchain", RunnableLambda(still_broken))
+
+    with pytest.raises(main.OutputParserException):
+        collect()
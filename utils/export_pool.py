@@ -0,0 +1,114 @@
+import os
+import time
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from utils.metrics import metrics
+
+
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "2"))
+EXPORT_QUEUE_SIZE = int(os.getenv("EXPORT_QUEUE_SIZE", "8"))
+
+
+class ExportQueueFull(Exception):
+    def __init__(self, retry_after):
+        super().__init__("export queue is full")
+        self.retry_after = retry_after
+
+
+def warm_worker():
+    # runs once per worker process: import pptx and build the theme before the first deck arrives
+    from utils.presentation_maker import theme_template
+    theme_template()
+
+
+def render_pptx(payload, images):
+    from utils.presentation_maker import build_presentation, presentation_bytes
+    started = time.perf_counter()
+    content = presentation_bytes(build_presentation(payload, images))
+    return content, time.perf_counter() - started
+
+
+def prepare_variants(images, size):
+    from utils.image_variants import prepare_images
+    started = time.perf_counter()
+    variants = prepare_images(images, size)
+    return variants, time.perf_counter() - started
+
+
+def _ready():
+    return os.getpid()
+
+
+class ExportPool:
+    def __init__(self, workers=EXPORT_WORKERS, queue_size=EXPORT_QUEUE_SIZE):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.pending = 0
+        self.service_time = None
+        self._executor = None
+
+    async def start(self):
+        if self.workers <= 0 or self._executor is not None:
+            return
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=warm_worker,
+        )
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(
+            loop.run_in_executor(self._executor, _ready) for _ in range(self.workers)
+        ))
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def estimated_wait(self):
+        service = self.service_time or 1.0
+        return service * (self.pending // max(self.workers, 1) + 1)
+
+    async def render(self, payload, images):
+        return await self._submit(render_pptx, payload, images)
+
+    async def prepare(self, images, size):
+        # pillow resize and re-encode for the stream engine, off the event loop's shared threadpool
+        return await self._submit(prepare_variants, images, size)
+
+    async def _submit(self, fn, *args):
+        if self._executor is None:
+            raise RuntimeError("export pool is not running")
+        if self.pending >= self.workers + self.queue_size:
+            metrics.inc("export_pool.rejected")
+            raise ExportQueueFull(self.estimated_wait())
+
+        self.pending += 1
+        submitted = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            result, service = await loop.run_in_executor(self._executor, fn, *args)
+        finally:
+            self.pending -= 1
+
+        total = time.perf_counter() - submitted
+        # exponentially weighted service time feeds the Retry-After estimate
+        self.service_time = service if self.service_time is None else 0.8 * self.service_time + 0.2 * service
+        metrics.inc("export_pool.completed")
+        metrics.inc("export_pool.service_seconds", service)
+        metrics.inc("export_pool.wait_seconds", max(total - service, 0.0))
+        return result
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "depth": self.pending,
+            "queued": max(self.pending - self.workers, 0),
+            "service_time": self.service_time,
+            "running": self._executor is not None,
+        }
+
+
+export_pool = ExportPool()
@@ -0,0 +1,59 @@
+import os
+import httpx
+
+try:
+    import h2  # noqa: F401
+    HTTP2 = os.getenv("HTTP2", "1") == "1"
+except ImportError:
+    HTTP2 = False
+
+TIMEOUT = httpx.Timeout(float(os.getenv("HTTP_TIMEOUT", "10")), connect=5.0)
+LIMITS = httpx.Limits(
+    max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", "50")),
+    max_keepalive_connections=int(os.getenv("HTTP_MAX_KEEPALIVE", "20")),
+    keepalive_expiry=float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60")),
+)
+
+_clients = {}
+
+
+def _async_client(name, **kwargs):
+    client = _clients.get(name)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(http2=HTTP2, timeout=TIMEOUT, limits=LIMITS, **kwargs)
+        _clients[name] = client
+    return client
+
+
+def pexels_client():
+    return _async_client(
+        "pexels",
+        base_url="https://api.pexels.com",
+        headers={"Authorization": os.getenv("VITE_API_KEY") or ""},
+    )
+
+
+def image_client():
+    return _async_client("images", follow_redirects=True)
+
+
+def groq_clients(name, hook, ahook):
+    # handed to ChatGroq at import time and cannot be swapped afterwards, so these live for
+    # the whole process and are left out of close_clients
+    sync_client = httpx.Client(http2=HTTP2, limits=LIMITS, event_hooks={"response": [hook]})
+    async_client = httpx.AsyncClient(http2=HTTP2, limits=LIMITS, event_hooks={"response": [ahook]})
+    return sync_client, async_client
+
+
+def open_clients():
+    pexels_client()
+    image_client()
+
+
+async def close_clients():
+    for name, client in list(_clients.items()):
+        if isinstance(client, httpx.AsyncClient):
+            await client.aclose()
+        else:
+            client.close()
+        del _clients[name]
@@ -1,15 +1,35 @@
 import os
+import asyncio
+from urllib.parse import urlsplit, urlunsplit, urlencode
 from dotenv import load_dotenv
-from pexelsapi.pexels import Pexels
+from utils.http import pexels_client, image_client
+from utils.image_cache import image_cache
 load_dotenv()
-pexel = Pexels(api_key=os.getenv('VITE_API_KEY'))
-# search_photos = pexel.search_photos(query='ocean', size='large', page=1, per_page=1)
-# print(search_photos)
 
+FALLBACK_IMAGE = "https://picsum.photos/600/400"
+MAX_CONCURRENT_LOOKUPS = int(os.getenv("PEXELS_CONCURRENCY", "8"))
+MAX_CONCURRENT_DOWNLOADS = int(os.getenv("IMAGE_DOWNLOAD_CONCURRENCY", "16"))
+EXPORT_IMAGE_DEADLINE = float(os.getenv("EXPORT_IMAGE_DEADLINE", "15"))
+# pexels renditions: original, large2x, large, medium, small, portrait, landscape, tiny
+PREVIEW_RENDITION = os.getenv("PEXELS_PREVIEW_RENDITION", "medium")
 
-async def get_url(keyword: str):
+
+class AsyncPexels:
+    async def search_photos(self, query, per_page=1, page=1):
+        response = await pexels_client().get(
+            "/v1/search",
+            params={"query": query, "per_page": per_page, "page": page},
+        )
+        response.raise_for_status()
+        return response.json()
+
+
+pexel = AsyncPexels()
+
+
+async def get_src(keyword: str):
     try:
-        response = pexel.search_photos(
+        response = await pexel.search_photos(
             query=keyword,
             per_page=1
         )
@@ -18,42 +38,85 @@ async def get_url(keyword: str):
         if not photos:
             return None
 
-        return photos[0]["src"].get("large")
+        return photos[0]["src"]
 
     except Exception as e:
         print("Pexels error:", e)
         return None
 
 
-async def resolve_images(slides):
-    resolved = []
+def pick_rendition(src, rendition=PREVIEW_RENDITION):
+    if not src:
+        return None
+    return src.get(rendition) or src.get("large")
 
-    for slide in slides:
-        image_query = (
-            getattr(slide, "image", None)
-            or getattr(slide, "title", None)
-            or "science technology illustration"
-        )
 
-        image_url = await get_url(image_query)
+def sized_url(url:str, size:int):
+    # every pexels rendition is the original photo behind different resize parameters
+    parts = urlsplit(url)
+    if parts.hostname != "images.pexels.com":
+        return url
+    query = urlencode({"auto": "compress", "cs": "tinysrgb", "fit": "crop", "w": size, "h": size})
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, query, ""))
+
+
+async def get_url(keyword: str, rendition=PREVIEW_RENDITION):
+    return pick_rendition(await get_src(keyword), rendition)
+
+
+async def resolve_image(slide, semaphore=None):
+    image_query = (
+        getattr(slide, "image", None)
+        or getattr(slide, "title", None)
+        or "science technology illustration"
+    )
+
+    if semaphore is None:
+        src = await get_src(image_query)
+    else:
+        async with semaphore:
+            src = await get_src(image_query)
 
-        slide.image = image_url or "https://picsum.photos/600/400"
-        resolved.append(slide)
+    slide.image = pick_rendition(src) or FALLBACK_IMAGE
+    slide.image_src = src
+    return slide
 
-    return resolved
+
+async def resolve_images(slides, concurrency=MAX_CONCURRENT_LOOKUPS):
+    semaphore = asyncio.Semaphore(concurrency)
+    return list(await asyncio.gather(*(resolve_image(slide, semaphore) for slide in slides)))
 
 
 async def resolve_new_img(keyword:str):
-    try:
-        response = pexel.search_photos(
-            query=keyword,
-            per_page=1
-        )
-        photo = response.get("photos")
-        return photo[0]["src"].get("large")
+    return await get_url(keyword)
+
 
+async def download_image(url:str):
+    try:
+        return await image_cache.fetch(url, image_client())
     except Exception as e:
-        print("Error while generating..")
+        print("Image download error:", e)
         return None
-    
 
+
+async def fetch_images(urls, deadline=EXPORT_IMAGE_DEADLINE, concurrency=MAX_CONCURRENT_DOWNLOADS, size=None):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(url):
+        async with semaphore:
+            return url, await download_image(sized_url(url, size) if size else url)
+
+    tasks = [asyncio.ensure_future(fetch(url)) for url in dict.fromkeys(urls) if url]
+    if not tasks:
+        return {}
+
+    done, pending = await asyncio.wait(tasks, timeout=deadline)
+    for task in pending:
+        task.cancel()
+
+    images = {}
+    for task in done:
+        url, content = task.result()
+        if content:
+            images[url] = content
+    return images
@@ -0,0 +1,152 @@
+import os
+import time
+import asyncio
+import sqlite3
+import hashlib
+import threading
+from utils.metrics import metrics
+
+
+class ImageCache:
+    def __init__(self, root, max_bytes, fresh_for=86400):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.fresh_for = fresh_for
+        self._lock = threading.Lock()
+        self._db = None
+        self._total = 0
+
+    def _open(self):
+        # called with the lock held; the directory and index are created on first use, not on import
+        if self._db is not None:
+            return self._db
+        os.makedirs(os.path.join(self.root, "blobs"), exist_ok=True)
+        db = sqlite3.connect(os.path.join(self.root, "index.db"), check_same_thread=False)
+        db.executescript(
+            "PRAGMA journal_mode=WAL;"
+            "CREATE TABLE IF NOT EXISTS urls (url TEXT PRIMARY KEY, hash TEXT NOT NULL, "
+            "etag TEXT, last_modified TEXT, fetched REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS blobs (hash TEXT PRIMARY KEY, size INTEGER NOT NULL, "
+            "accessed REAL NOT NULL);"
+        )
+        db.commit()
+        self._total = db.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+        self._db = db
+        return db
+
+    def _path(self, digest):
+        return os.path.join(self.root, "blobs", digest)
+
+    def _lookup(self, url):
+        with self._lock:
+            return self._open().execute(
+                "SELECT hash, etag, last_modified, fetched FROM urls WHERE url = ?", (url,)
+            ).fetchone()
+
+    def _read(self, digest):
+        try:
+            with open(self._path(digest), "rb") as f:
+                content = f.read()
+        except OSError:
+            return None
+        with self._lock:
+            self._db.execute("UPDATE blobs SET accessed = ? WHERE hash = ?", (time.time(), digest))
+            self._db.commit()
+        return content
+
+    def _store(self, url, content, etag, last_modified):
+        digest = hashlib.sha256(content).hexdigest()
+        path = self._path(digest)
+        # identical bytes behind different urls share one blob
+        with self._lock:
+            self._open()
+        if not os.path.exists(path):
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(content)
+            os.replace(tmp, path)
+        now = time.time()
+        with self._lock:
+            known = self._db.execute("SELECT size FROM blobs WHERE hash = ?", (digest,)).fetchone()
+            if known is None:
+                self._total += len(content)
+            self._db.execute(
+                "INSERT OR REPLACE INTO blobs (hash, size, accessed) VALUES (?, ?, ?)",
+                (digest, len(content), now)
+            )
+            self._db.execute(
+                "INSERT OR REPLACE INTO urls (url, hash, etag, last_modified, fetched) VALUES (?, ?, ?, ?, ?)",
+                (url, digest, etag, last_modified, now)
+            )
+            self._db.commit()
+            self._evict()
+
+    def _revalidated(self, url):
+        with self._lock:
+            self._db.execute("UPDATE urls SET fetched = ? WHERE url = ?", (time.time(), url))
+            self._db.commit()
+
+    def _evict(self):
+        # _total tracks SUM(size) so a store within budget never scans the table
+        if self._total <= self.max_bytes:
+            return
+        for digest, size in self._db.execute(
+            "SELECT hash, size FROM blobs ORDER BY accessed"
+        ).fetchall():
+            if self._total <= self.max_bytes:
+                break
+            try:
+                os.remove(self._path(digest))
+            except OSError:
+                pass
+            self._db.execute("DELETE FROM blobs WHERE hash = ?", (digest,))
+            self._db.execute("DELETE FROM urls WHERE hash = ?", (digest,))
+            self._total -= size
+            metrics.inc("image_cache.evictions")
+        self._db.commit()
+
+    async def fetch(self, url, client):
+        # sqlite and blob file access run in worker threads so downloads never block the event loop
+        row = await asyncio.to_thread(self._lookup, url)
+        headers = {}
+        if row is not None:
+            digest, etag, last_modified, fetched = row
+            if time.time() - fetched < self.fresh_for:
+                content = await asyncio.to_thread(self._read, digest)
+                if content is not None:
+                    metrics.inc("image_cache.hits")
+                    return content
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+        response = await client.get(url, headers=headers, timeout=5)
+        if response.status_code == 304 and row is not None:
+            content = await asyncio.to_thread(self._read, row[0])
+            if content is not None:
+                metrics.inc("image_cache.revalidated")
+                await asyncio.to_thread(self._revalidated, url)
+                return content
+            response = await client.get(url, timeout=5)
+
+        response.raise_for_status()
+        metrics.inc("image_cache.misses")
+        await asyncio.to_thread(
+            self._store, url, response.content, response.headers.get("etag"), response.headers.get("last-modified")
+        )
+        return response.content
+
+    def stats(self):
+        with self._lock:
+            if self._db is None:
+                return {"blobs": 0, "bytes": 0, "max_bytes": self.max_bytes}
+            count = self._db.execute("SELECT COUNT(*) FROM blobs").fetchone()[0]
+            return {"blobs": count, "bytes": self._total, "max_bytes": self.max_bytes}
+
+
+image_cache = ImageCache(
+    root=os.getenv("IMAGE_CACHE_DIR", "/tmp/slideforge-images"),
+    max_bytes=int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(512 * 1024 * 1024))),
+    fresh_for=float(os.getenv("IMAGE_CACHE_FRESH", "86400")),
+)
@@ -0,0 +1,88 @@
+import io
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from PIL import Image, ImageOps
+from utils.metrics import metrics
+
+
+EXPORT_IMAGE_DPI = int(os.getenv("EXPORT_IMAGE_DPI", "150"))
+EXPORT_IMAGE_QUALITY = int(os.getenv("EXPORT_IMAGE_QUALITY", "80"))
+# python-pptx can only embed formats PowerPoint understands, so no WebP here
+EXPORT_IMAGE_FORMAT = os.getenv("EXPORT_IMAGE_FORMAT", "JPEG").upper()
+VARIANT_CACHE_SIZE = int(os.getenv("IMAGE_VARIANT_CACHE_SIZE", "256"))
+
+_variants = OrderedDict()
+_lock = threading.Lock()
+
+
+def frame_pixels(frame_inches, dpi=EXPORT_IMAGE_DPI):
+    return max(1, round(frame_inches * dpi))
+
+
+def _encode(content, size, quality, fmt):
+    with Image.open(io.BytesIO(content)) as img:
+        img.draft("RGB", (size, size))
+        img = ImageOps.exif_transpose(img)
+        img = ImageOps.fit(img, (size, size), Image.LANCZOS, centering=(0.5, 0.5))
+        if fmt == "JPEG" and img.mode != "RGB":
+            img = img.convert("RGB")
+        out = io.BytesIO()
+        if fmt == "JPEG":
+            img.save(out, format=fmt, quality=quality, optimize=True, progressive=True)
+        else:
+            img.save(out, format=fmt, optimize=True)
+        return out.getvalue()
+
+
+def variant_key(content, size, quality=EXPORT_IMAGE_QUALITY, fmt=EXPORT_IMAGE_FORMAT):
+    return (hashlib.sha256(content).hexdigest(), size, quality, fmt)
+
+
+def has_variant(content, size):
+    with _lock:
+        return variant_key(content, size) in _variants
+
+
+def seed_variant(content, size, variant):
+    # variants encoded in an export worker process are handed back here for render_entry to find
+    with _lock:
+        _variants[variant_key(content, size)] = variant
+        while len(_variants) > VARIANT_CACHE_SIZE:
+            _variants.popitem(last=False)
+
+
+def prepare_images(images, size):
+    return {url: prepare_image(content, size) for url, content in images.items()}
+
+
+def prepare_image(content, size, quality=EXPORT_IMAGE_QUALITY, fmt=EXPORT_IMAGE_FORMAT):
+    key = variant_key(content, size, quality, fmt)
+    with _lock:
+        cached = _variants.get(key)
+        if cached is not None:
+            _variants.move_to_end(key)
+            metrics.inc("image_variants.hits")
+            return cached
+
+    started = time.perf_counter()
+    try:
+        variant = _encode(content, size, quality, fmt)
+    except Exception as e:
+        # bytes pillow cannot decode (an error page served as 200, say) are not embedded at all
+        print("Image processing error:", e)
+        metrics.inc("image_variants.failures")
+        return None
+
+    metrics.inc("image_variants.misses")
+    metrics.inc("image_variants.bytes_in", len(content))
+    metrics.inc("image_variants.bytes_out", len(variant))
+    metrics.inc("image_variants.seconds", time.perf_counter() - started)
+
+    with _lock:
+        _variants[key] = variant
+        while len(_variants) > VARIANT_CACHE_SIZE:
+            _variants.popitem(last=False)
+    return variant
@@ -0,0 +1,109 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import sqlite3
+import threading
+from collections import OrderedDict
+
+
+class JobStore:
+    def __init__(self, max_jobs=500, ttl=3600, db_path=None):
+        self.max_jobs = max_jobs
+        self.ttl = ttl
+        self.db_path = db_path
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs "
+                "(id TEXT PRIMARY KEY, value TEXT NOT NULL, updated REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def create(self):
+        now = time.time()
+        job = {
+            "id": uuid.uuid4().hex,
+            "status": "queued",
+            "stage": None,
+            "result": None,
+            "error": None,
+            "created": now,
+            "updated": now,
+        }
+        self._save(job)
+        return dict(job)
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            job = self.get(job_id)
+        if job is None:
+            return None
+        job = {**job, **fields, "updated": time.time()}
+        self._save(job)
+        return dict(job)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                self._jobs.move_to_end(job_id)
+                return dict(job)
+            if self._db is None:
+                return None
+            row = self._db.execute(
+                "SELECT value, updated FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None or row[1] + self.ttl < time.time():
+            return None
+        return json.loads(row[0])
+
+    # async variants for the event loop: with a database every save is an INSERT and a commit
+    async def acreate(self):
+        if self._db is None:
+            return self.create()
+        return await asyncio.to_thread(self.create)
+
+    async def aupdate(self, job_id, **fields):
+        if self._db is None:
+            return self.update(job_id, **fields)
+        return await asyncio.to_thread(self.update, job_id, **fields)
+
+    async def aget(self, job_id):
+        if self._db is None:
+            return self.get(job_id)
+        return await asyncio.to_thread(self.get, job_id)
+
+    def _save(self, job):
+        with self._lock:
+            self._jobs[job["id"]] = job
+            self._jobs.move_to_end(job["id"])
+            self._evict()
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO jobs (id, value, updated) VALUES (?, ?, ?)",
+                    (job["id"], json.dumps(job, ensure_ascii=False), job["updated"])
+                )
+                self._db.execute("DELETE FROM jobs WHERE updated < ?", (time.time() - self.ttl,))
+                self._db.commit()
+
+    def _evict(self):
+        cutoff = time.time() - self.ttl
+        for job_id in [k for k, job in self._jobs.items() if job["updated"] < cutoff]:
+            del self._jobs[job_id]
+        while len(self._jobs) > self.max_jobs:
+            self._jobs.popitem(last=False)
+
+
+job_store = JobStore(
+    max_jobs=int(os.getenv("JOB_STORE_SIZE", "500")),
+    ttl=float(os.getenv("JOB_TTL", "3600")),
+    db_path=os.getenv("JOB_STORE_DB") or None,
+)
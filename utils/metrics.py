@@ -0,0 +1,22 @@
+import threading
+from collections import defaultdict
+
+
+class Metrics:
+    def __init__(self):
+        self._counters = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1):
+        with self._lock:
+            self._counters[name] += value
+
+    def get(self, name):
+        return self._counters.get(name, 0)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counters)
+
+
+metrics = Metrics()
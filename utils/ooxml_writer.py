@@ -0,0 +1,333 @@
+import io
+import os
+import re
+import json
+import zlib
+import struct
+import hashlib
+import zipfile
+import threading
+from xml.sax.saxutils import escape
+from PIL import Image
+from utils.cache import BytesCache
+from pptx import Presentation
+from utils.image_variants import prepare_image, frame_pixels
+from utils.presentation_maker import (
+    theme_template, create_elegant_slide, create_title_slide, clamp_text,
+    point_layout, TITLE_LAYOUT, CONTENT_LAYOUT, IMAGE_INCHES
+)
+
+
+CT_SLIDE = "application/vnd.openxmlformats-officedocument.presentationml.slide+xml"
+RT_SLIDE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/slide"
+RT_LAYOUT = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/slideLayout"
+RT_IMAGE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/image"
+XML_HEADER = "<?xml version='1.0' encoding='UTF-8' standalone='yes'?>\n"
+IMAGE_TYPES = {"jpg": "image/jpeg", "jpeg": "image/jpeg", "png": "image/png", "gif": "image/gif"}
+SLIDE_CACHE_MAX_BYTES = int(os.getenv("SLIDE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# sentinels rendered through the python-pptx builder and swapped for real text later
+TITLE = "@@TITLE@@"
+SUBTITLE = "@@SUBTITLE@@"
+AUTHOR = "@@AUTHOR@@"
+
+
+def point_key(i):
+    return f"@@P{i}@@"
+
+
+def explanation_key(i):
+    return f"@@E{i}@@"
+
+
+SENTINEL = re.compile(r"@@(?:TITLE|SUBTITLE|AUTHOR|P\d|E\d)@@")
+
+
+def fill(xml, values):
+    # one pass, so sentinel-looking user text is never substituted again
+    return SENTINEL.sub(lambda match: text_xml(values[match.group(0)]), xml)
+
+
+CONTROL_CHARS = re.compile(r"[\x00-\x08\x0B-\x1F]")
+
+
+def escape_ctrl_chars(text):
+    # control characters are not allowed in xml; python-pptx writes them as _xHHHH_ like word does
+    return CONTROL_CHARS.sub(lambda match: "_x%04X_" % ord(match.group(0)), text)
+
+
+def text_xml(text):
+    # python-pptx turns line breaks inside paragraph text into <a:br/>
+    return "</a:t></a:r><a:br/><a:r><a:t>".join(
+        escape(escape_ctrl_chars(part)) for part in re.split(r"[\n\v]", text)
+    )
+
+
+def image_extension(content):
+    if content.startswith(b"\x89PNG"):
+        return "png"
+    if content.startswith(b"GIF8"):
+        return "gif"
+    return "jpg"
+
+
+# 1980-01-01 00:00, the DOS epoch: fixed timestamps keep the output deterministic
+DOS_TIME = 0
+DOS_DATE = (1 << 5) | 1
+
+
+def zip_entry(data, compress=True):
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    if compress:
+        deflate = zlib.compressobj(6, zlib.DEFLATED, -15)
+        packed = deflate.compress(data) + deflate.flush()
+        method = zipfile.ZIP_DEFLATED
+    else:
+        packed = data
+        method = zipfile.ZIP_STORED
+    return zlib.crc32(data), packed, len(data), method
+
+
+class ZipStream:
+    # minimal zip writer that accepts already-compressed entries, so cached parts are reused as-is
+    def __init__(self):
+        self.offset = 0
+        self.directory = []
+
+    def add(self, name, entry):
+        crc, packed, size, method = entry
+        name = name.encode("utf-8")
+        header = struct.pack(
+            "<IHHHHHIIIHH", 0x04034b50, 20, 0, method, DOS_TIME, DOS_DATE,
+            crc, len(packed), size, len(name), 0
+        ) + name
+        self.directory.append(struct.pack(
+            "<IHHHHHHIIIHHHHHII", 0x02014b50, 20, 20, 0, method, DOS_TIME, DOS_DATE,
+            crc, len(packed), size, len(name), 0, 0, 0, 0, 0, self.offset
+        ) + name)
+        self.offset += len(header) + len(packed)
+        return header + packed
+
+    def finish(self):
+        directory = b"".join(self.directory)
+        count = len(self.directory)
+        return directory + struct.pack(
+            "<IHHHHIIH", 0x06054b50, 0, 0, count, count, len(directory), self.offset, 0
+        )
+
+
+class SlideTemplates:
+    def __init__(self, template):
+        self.template = template
+        self._variants = {}
+        self._lock = threading.Lock()
+
+        prs = Presentation(io.BytesIO(template))
+        self.title_layout = prs.slide_layouts[TITLE_LAYOUT].part.partname
+        self.content_layout = prs.slide_layouts[CONTENT_LAYOUT].part.partname
+
+        with zipfile.ZipFile(io.BytesIO(template)) as zf:
+            self.content_types = zf.read("[Content_Types].xml").decode("utf-8")
+            self.presentation = zf.read("ppt/presentation.xml").decode("utf-8")
+            self.presentation_rels = zf.read("ppt/_rels/presentation.xml.rels").decode("utf-8")
+            regenerated = {"[Content_Types].xml", "ppt/presentation.xml", "ppt/_rels/presentation.xml.rels"}
+            self.static_parts = [
+                (name, zip_entry(zf.read(name))) for name in zf.namelist() if name not in regenerated
+            ]
+
+        buffer = io.BytesIO()
+        Image.new("RGB", (8, 8)).save(buffer, format="JPEG")
+        self._sample_image = buffer.getvalue()
+
+    def _render(self, build):
+        prs = Presentation(io.BytesIO(self.template))
+        build(prs)
+        return prs.slides[0].part.blob.decode("utf-8")
+
+    def title_slide(self, subtitle, author):
+        key = ("title", bool(subtitle), bool(author))
+        with self._lock:
+            if key not in self._variants:
+                self._variants[key] = self._render(lambda prs: create_title_slide(
+                    prs, TITLE, SUBTITLE if subtitle else "", AUTHOR if author else "",
+                    layout=prs.slide_layouts[TITLE_LAYOUT]
+                ))
+            return self._variants[key]
+
+    def content_slide(self, count, has_image):
+        key = ("content", count, has_image)
+        with self._lock:
+            if key not in self._variants:
+                data = {
+                    "title": TITLE,
+                    "points": [point_key(i) for i in range(count)],
+                    "explanation": [explanation_key(i) for i in range(count)],
+                }
+                self._variants[key] = self._render(lambda prs: create_elegant_slide(
+                    prs, data, self._sample_image if has_image else None,
+                    layout=prs.slide_layouts[CONTENT_LAYOUT]
+                ))
+            return self._variants[key]
+
+
+_templates = None
+_templates_lock = threading.Lock()
+
+
+def slide_templates():
+    global _templates
+    if _templates is None:
+        with _templates_lock:
+            if _templates is None:
+                _templates = SlideTemplates(theme_template())
+    return _templates
+
+
+def title_slide_xml(templates, slide):
+    subtitle = slide.get("subtitle", "")
+    author = slide.get("author", "")
+    return fill(templates.title_slide(subtitle, author), {
+        TITLE: clamp_text(slide.get("title", "Presentation"), 100),
+        SUBTITLE: clamp_text(subtitle, 120) if subtitle else "",
+        AUTHOR: author,
+    })
+
+
+def content_slide_xml(templates, slide, has_image):
+    points = slide.get("points", [])
+    explanations = slide.get("explanation", [])
+    count = min(len(points), len(explanations), 4)
+    cfg = point_layout(count)
+
+    values = {TITLE: clamp_text(slide["title"], 85)}
+    for i in range(count):
+        values[point_key(i)] = clamp_text(points[i], 55)
+        values[explanation_key(i)] = clamp_text(explanations[i], cfg["max_chars"])
+    return fill(templates.content_slide(count, has_image), values)
+
+
+def slide_rels_xml(layout_partname, media_name=None):
+    rels = [
+        f'<Relationship Id="rId1" Type="{RT_LAYOUT}" Target="..{layout_partname[4:]}"/>'
+    ]
+    if media_name:
+        rels.append(f'<Relationship Id="rId2" Type="{RT_IMAGE}" Target="../media/{media_name}"/>')
+    return (
+        XML_HEADER
+        + '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        + "".join(rels) + "</Relationships>"
+    )
+
+
+def package_xml(templates, slide_count):
+    rel_ids = [int(n) for n in re.findall(r'Id="rId(\d+)"', templates.presentation_rels)]
+    first_rid = max(rel_ids, default=0) + 1
+
+    slide_rels = "".join(
+        f'<Relationship Id="rId{first_rid + i}" Type="{RT_SLIDE}" Target="slides/slide{i + 1}.xml"/>'
+        for i in range(slide_count)
+    )
+    presentation_rels = templates.presentation_rels.replace("</Relationships>", slide_rels + "</Relationships>")
+
+    slide_ids = "".join(
+        f'<p:sldId id="{256 + i}" r:id="rId{first_rid + i}"/>' for i in range(slide_count)
+    )
+    presentation = re.sub(r"<p:sldIdLst\s*/>|<p:sldIdLst>.*?</p:sldIdLst>", "", templates.presentation)
+    presentation = presentation.replace(
+        "</p:sldMasterIdLst>", f"</p:sldMasterIdLst><p:sldIdLst>{slide_ids}</p:sldIdLst>", 1
+    )
+
+    types = [
+        f'<Default Extension="{ext}" ContentType="{content_type}"/>'
+        for ext, content_type in IMAGE_TYPES.items()
+        if f'Extension="{ext}"' not in templates.content_types
+    ]
+    types += [
+        f'<Override PartName="/ppt/slides/slide{i + 1}.xml" ContentType="{CT_SLIDE}"/>'
+        for i in range(slide_count)
+    ]
+    content_types = templates.content_types.replace("</Types>", "".join(types) + "</Types>")
+    return content_types, presentation, presentation_rels
+
+
+# every entry holds its packed xml and processed image, so the cache is bounded by bytes
+slide_parts = BytesCache(max_bytes=SLIDE_CACHE_MAX_BYTES)
+
+
+def parts_size(parts):
+    title_part, content_part, media = parts
+    return len(title_part[1]) + len(content_part[1]) + (len(media[2][1]) if media else 0)
+
+
+def render_entry(templates, slide, image, size):
+    # a deck entry renders to the same parts wherever it sits in the deck, so they are cached by content
+    key = (
+        hashlib.sha256(json.dumps(slide, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest(),
+        hashlib.sha1(image).hexdigest() if image else None,
+        size,
+    )
+    parts = slide_parts.get(key)
+    if parts is not None:
+        return parts
+
+    media = None
+    content = prepare_image(image, size) if image else None
+    if content:
+        media = (hashlib.sha1(content).hexdigest(), image_extension(content), zip_entry(content, compress=False))
+    parts = (
+        zip_entry(title_slide_xml(templates, slide)),
+        zip_entry(content_slide_xml(templates, slide, media is not None)),
+        media,
+    )
+    slide_parts.put(key, parts, parts_size(parts))
+    return parts
+
+
+def render_deck(slides, images=None):
+    templates = slide_templates()
+    size = frame_pixels(IMAGE_INCHES)
+    images = images or {}
+    return [render_entry(templates, slide, images.get(slide.get("image")), size) for slide in slides]
+
+
+def stream_presentation(slides, images=None, rendered=None):
+    # pass parts from render_deck to surface render errors before the first byte is sent
+    templates = slide_templates()
+    if rendered is None:
+        rendered = render_deck(slides, images)
+    content_types, presentation, presentation_rels = package_xml(templates, 2 * len(slides))
+    title_rels = zip_entry(slide_rels_xml(templates.title_layout))
+    plain_rels = zip_entry(slide_rels_xml(templates.content_layout))
+
+    zf = ZipStream()
+    yield zf.add("[Content_Types].xml", zip_entry(content_types))
+    yield zf.add("ppt/presentation.xml", zip_entry(presentation))
+    yield zf.add("ppt/_rels/presentation.xml.rels", zip_entry(presentation_rels))
+    for name, entry in templates.static_parts:
+        yield zf.add(name, entry)
+
+    # like python-pptx, identical image bytes are stored once
+    media_names = {}
+    number = 0
+    for title_part, content_part, media in rendered:
+
+        number += 1
+        yield zf.add(f"ppt/slides/slide{number}.xml", title_part)
+        yield zf.add(f"ppt/slides/_rels/slide{number}.xml.rels", title_rels)
+
+        rels = plain_rels
+        if media is not None:
+            digest, ext, entry = media
+            media_name = media_names.get(digest)
+            if media_name is None:
+                media_name = f"image{len(media_names) + 1}.{ext}"
+                media_names[digest] = media_name
+                yield zf.add(f"ppt/media/{media_name}", entry)
+            rels = zip_entry(slide_rels_xml(templates.content_layout, media_name))
+
+        number += 1
+        yield zf.add(f"ppt/slides/slide{number}.xml", content_part)
+        yield zf.add(f"ppt/slides/_rels/slide{number}.xml.rels", rels)
+
+    yield zf.finish()
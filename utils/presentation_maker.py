@@ -1,11 +1,13 @@
+import io
 import os
-import uuid
-import requests
+import hashlib
+import threading
 from pptx import Presentation
 from pptx.util import Inches, Pt
 from pptx.dml.color import RGBColor
 from pptx.enum.shapes import MSO_SHAPE
 from pptx.enum.text import PP_ALIGN, MSO_ANCHOR
+from utils.image_variants import prepare_image, frame_pixels
 
 
 def hex_to_rgb(hex_color):
@@ -19,6 +21,21 @@ def clamp_text(text, max_chars):
     return text[:max_chars].rsplit(" ", 1)[0] + "…"
 
 
+CONTENT_TOP = 2.0
+CONTENT_HEIGHT = 5.0
+IMAGE_LEFT_INCHES = 6.7
+IMAGE_TOP_INCHES = CONTENT_TOP + 0.3
+IMAGE_FRAME_INCHES = 2.9
+IMAGE_INSET_INCHES = 0.12
+IMAGE_INCHES = IMAGE_FRAME_INCHES - 2 * IMAGE_INSET_INCHES
+
+# layouts of the theme template that carry the static decoration
+TITLE_LAYOUT = 5
+CONTENT_LAYOUT = 6
+THEME_TEMPLATE = os.getenv("THEME_TEMPLATE")
+EXPORT_BUILDER = os.getenv("EXPORT_BUILDER", "template")
+
+
 class ColorPalette:
     BACKGROUND = "0A0E27"
     CARD_BG = "0F1729"
@@ -44,8 +61,9 @@ class TypographyConfig:
     FONT_SIZE_EXP_1 = Pt(16)
 
 
-def create_elegant_slide(prs, slide_data):
-    slide = prs.slides.add_slide(prs.slide_layouts[6])
+def draw_content_decoration(slide, prs):
+    content_top = CONTENT_TOP
+    content_height = CONTENT_HEIGHT
     
     bg = slide.shapes.add_shape(
         MSO_SHAPE.RECTANGLE, 0, 0, prs.slide_width, prs.slide_height
@@ -102,6 +120,87 @@ def create_elegant_slide(prs, slide_data):
     title_accent.fill.fore_color.rgb = hex_to_rgb(ColorPalette.ACCENT_CYAN)
     title_accent.line.fill.background()
     
+    left_panel = slide.shapes.add_shape(
+        MSO_SHAPE.ROUNDED_RECTANGLE,
+        Inches(0.3), Inches(content_top),
+        Inches(6.2), Inches(content_height)
+    )
+    left_panel.fill.solid()
+    left_panel.fill.fore_color.rgb = hex_to_rgb(ColorPalette.CARD_BG)
+    left_panel.fill.transparency = 0.15
+    left_panel.line.color.rgb = hex_to_rgb(ColorPalette.BORDER_COLOR)
+    left_panel.line.width = Pt(0.75)
+    left_panel.adjustments[0] = 0.08
+    
+    img_size = Inches(IMAGE_FRAME_INCHES)
+    img_left = Inches(IMAGE_LEFT_INCHES)
+    img_top = Inches(IMAGE_TOP_INCHES)
+    
+    img_frame = slide.shapes.add_shape(
+        MSO_SHAPE.ROUNDED_RECTANGLE,
+        img_left, img_top, img_size, img_size
+    )
+    img_frame.fill.solid()
+    img_frame.fill.fore_color.rgb = hex_to_rgb(ColorPalette.CARD_BG)
+    img_frame.fill.transparency = 0.05
+    img_frame.line.color.rgb = hex_to_rgb(ColorPalette.ACCENT_PURPLE)
+    img_frame.line.width = Pt(1.5)
+    img_frame.adjustments[0] = 0.08
+    
+    footer_line = slide.shapes.add_shape(
+        MSO_SHAPE.RECTANGLE,
+        Inches(0.3), Inches(7.35),
+        Inches(9.4), Inches(0.03)
+    )
+    footer_line.fill.solid()
+    footer_line.fill.fore_color.rgb = hex_to_rgb(ColorPalette.ACCENT_CYAN)
+    footer_line.line.fill.background()
+
+
+POINT_LAYOUTS = {
+    1: {
+        "point_size": TypographyConfig.FONT_SIZE_POINT_1,
+        "exp_size": TypographyConfig.FONT_SIZE_EXP_1,
+        "max_chars": 150,
+        "line_spacing": 1.3,
+        "vertical_spacing": 0.15
+    },
+    2: {
+        "point_size": TypographyConfig.FONT_SIZE_POINT_2,
+        "exp_size": TypographyConfig.FONT_SIZE_EXP_2,
+        "max_chars": 130,
+        "line_spacing": 1.3,
+        "vertical_spacing": 0.25
+    },
+    3: {
+        "point_size": TypographyConfig.FONT_SIZE_POINT_3,
+        "exp_size": TypographyConfig.FONT_SIZE_EXP_3,
+        "max_chars": 115,
+        "line_spacing": 1.4,
+        "vertical_spacing": 0.35
+    },
+    4: {
+        "point_size": TypographyConfig.FONT_SIZE_POINT_4,
+        "exp_size": TypographyConfig.FONT_SIZE_EXP_4,
+        "max_chars": 100,
+        "line_spacing": 1.25,
+        "vertical_spacing": 0.2
+    }
+}
+
+
+def point_layout(count):
+    # a slide without points still needs a layout for its (empty) text box
+    return POINT_LAYOUTS[max(1, min(count, 4))]
+
+
+def create_elegant_slide(prs, slide_data, image_bytes=None, layout=None):
+    if layout is None:
+        slide = prs.slides.add_slide(prs.slide_layouts[6])
+        draw_content_decoration(slide, prs)
+    else:
+        slide = prs.slides.add_slide(layout)
+    
     title_box = slide.shapes.add_textbox(
     Inches(0.6), Inches(0.35), Inches(8.8), Inches(1.2)
     )
@@ -116,20 +215,8 @@ def create_elegant_slide(prs, slide_data):
     title.font.color.rgb = hex_to_rgb(ColorPalette.TEXT_PRIMARY)
     title.font.name = TypographyConfig.FONT_PRIMARY
     
-    content_top = 2.0
-    content_height = 5.0
-    
-    left_panel = slide.shapes.add_shape(
-        MSO_SHAPE.ROUNDED_RECTANGLE,
-        Inches(0.3), Inches(content_top),
-        Inches(6.2), Inches(content_height)
-    )
-    left_panel.fill.solid()
-    left_panel.fill.fore_color.rgb = hex_to_rgb(ColorPalette.CARD_BG)
-    left_panel.fill.transparency = 0.15
-    left_panel.line.color.rgb = hex_to_rgb(ColorPalette.BORDER_COLOR)
-    left_panel.line.width = Pt(0.75)
-    left_panel.adjustments[0] = 0.08
+    content_top = CONTENT_TOP
+    content_height = CONTENT_HEIGHT
     
     text_box = slide.shapes.add_textbox(
         Inches(0.55), Inches(content_top + 0.25),
@@ -144,39 +231,7 @@ def create_elegant_slide(prs, slide_data):
     explanations = slide_data.get("explanation", [])
     count = min(len(points), len(explanations), 4)
     
-    config_map = {
-        1: {
-            "point_size": TypographyConfig.FONT_SIZE_POINT_1,
-            "exp_size": TypographyConfig.FONT_SIZE_EXP_1,
-            "max_chars": 150,
-            "line_spacing": 1.3,
-            "vertical_spacing": 0.15
-        },
-        2: {
-            "point_size": TypographyConfig.FONT_SIZE_POINT_2,
-            "exp_size": TypographyConfig.FONT_SIZE_EXP_2,
-            "max_chars": 130,
-            "line_spacing": 1.3,
-            "vertical_spacing": 0.25
-        },
-        3: {
-            "point_size": TypographyConfig.FONT_SIZE_POINT_3,
-            "exp_size": TypographyConfig.FONT_SIZE_EXP_3,
-            "max_chars": 115,
-            "line_spacing": 1.4,
-            "vertical_spacing": 0.35
-        },
-        4: {
-                "point_size": Pt(22),       
-                "exp_size": Pt(12),          
-                "line_spacing": 1.25,        
-                "space_before": 0,          
-                "space_after_point": 1,      
-                "space_after_exp": 3      
-            }
-    }
-    
-    cfg = config_map[count]
+    cfg = point_layout(count)
     
     for i in range(count):
         p = tf.paragraphs[0] if i == 0 else tf.add_paragraph()
@@ -196,53 +251,23 @@ def create_elegant_slide(prs, slide_data):
         exp.line_spacing = cfg["line_spacing"]
         exp.space_after = Pt(0)
     
-    img_size = Inches(2.9)
-    img_left = Inches(6.7)
-    img_top = Inches(content_top + 0.3)
-    
-    img_frame = slide.shapes.add_shape(
-        MSO_SHAPE.ROUNDED_RECTANGLE,
-        img_left, img_top, img_size, img_size
-    )
-    img_frame.fill.solid()
-    img_frame.fill.fore_color.rgb = hex_to_rgb(ColorPalette.CARD_BG)
-    img_frame.fill.transparency = 0.05
-    img_frame.line.color.rgb = hex_to_rgb(ColorPalette.ACCENT_PURPLE)
-    img_frame.line.width = Pt(1.5)
-    img_frame.adjustments[0] = 0.08
+    img_left = Inches(IMAGE_LEFT_INCHES)
+    img_top = Inches(IMAGE_TOP_INCHES)
     
     try:
-        if "image" in slide_data and slide_data["image"]:
-            img_bytes = requests.get(slide_data["image"], timeout=5).content
-            path = f"{uuid.uuid4()}.jpg"
-            with open(path, "wb") as f:
-                f.write(img_bytes)
-            
+        if image_bytes:
             slide.shapes.add_picture(
-                path,
-                img_left + Inches(0.12),
-                img_top + Inches(0.12),
-                width=img_size - Inches(0.24),
-                height=img_size - Inches(0.24)
+                io.BytesIO(image_bytes),
+                img_left + Inches(IMAGE_INSET_INCHES),
+                img_top + Inches(IMAGE_INSET_INCHES),
+                width=Inches(IMAGE_INCHES),
+                height=Inches(IMAGE_INCHES)
             )
-            
-            os.remove(path)
     except Exception as e:
         pass
-    
-    footer_line = slide.shapes.add_shape(
-        MSO_SHAPE.RECTANGLE,
-        Inches(0.3), Inches(7.35),
-        Inches(9.4), Inches(0.03)
-    )
-    footer_line.fill.solid()
-    footer_line.fill.fore_color.rgb = hex_to_rgb(ColorPalette.ACCENT_CYAN)
-    footer_line.line.fill.background()
 
 
-def create_title_slide(prs, title, subtitle="", author=""):
-    slide = prs.slides.add_slide(prs.slide_layouts[6])
-    
+def draw_title_decoration(slide, prs):
     bg = slide.shapes.add_shape(
         MSO_SHAPE.RECTANGLE, 0, 0, prs.slide_width, prs.slide_height
     )
@@ -269,6 +294,14 @@ def create_title_slide(prs, title, subtitle="", author=""):
     glow2.fill.fore_color.rgb = hex_to_rgb(ColorPalette.ACCENT_PURPLE)
     glow2.fill.transparency = 0.91
     glow2.line.fill.background()
+
+
+def create_title_slide(prs, title, subtitle="", author="", layout=None):
+    if layout is None:
+        slide = prs.slides.add_slide(prs.slide_layouts[6])
+        draw_title_decoration(slide, prs)
+    else:
+        slide = prs.slides.add_slide(layout)
     
     title_box = slide.shapes.add_textbox(
         Inches(1), Inches(2.5), Inches(8), Inches(1.5)
@@ -308,3 +341,86 @@ def create_title_slide(prs, title, subtitle="", author=""):
         p.font.name = TypographyConfig.FONT_PRIMARY
         p.alignment = PP_ALIGN.CENTER
 
+
+def new_presentation():
+    prs = Presentation()
+    prs.slide_width = Inches(10)
+    prs.slide_height = Inches(7.5)
+    return prs
+
+
+def decorate_layout(prs, layout, draw):
+    for placeholder in list(layout.placeholders):
+        placeholder._element.getparent().remove(placeholder._element)
+
+    # draw on a scratch slide, then move the finished shapes onto the layout
+    slide = prs.slides.add_slide(layout)
+    draw(slide, prs)
+    for shape in list(slide.shapes):
+        layout.shapes._spTree.append(shape._element)
+
+    slide_ids = prs.slides._sldIdLst
+    scratch = slide_ids[-1]
+    prs.part.drop_rel(scratch.rId)
+    slide_ids.remove(scratch)
+
+
+def build_theme_template():
+    prs = new_presentation()
+    decorate_layout(prs, prs.slide_layouts[TITLE_LAYOUT], draw_title_decoration)
+    decorate_layout(prs, prs.slide_layouts[CONTENT_LAYOUT], draw_content_decoration)
+    return presentation_bytes(prs)
+
+
+_theme = None
+_theme_lock = threading.Lock()
+
+
+def theme_template():
+    global _theme
+    if _theme is None:
+        with _theme_lock:
+            if _theme is None:
+                if THEME_TEMPLATE:
+                    with open(THEME_TEMPLATE, "rb") as f:
+                        _theme = f.read()
+                else:
+                    _theme = build_theme_template()
+    return _theme
+
+
+def theme_version():
+    return hashlib.sha256(theme_template()).hexdigest()[:16]
+
+
+def build_presentation(slides, images=None, builder=EXPORT_BUILDER):
+    size = frame_pixels(IMAGE_INCHES)
+    images = {url: prepare_image(content, size) for url, content in (images or {}).items()}
+
+    if builder == "template":
+        prs = Presentation(io.BytesIO(theme_template()))
+        title_layout = prs.slide_layouts[TITLE_LAYOUT]
+        content_layout = prs.slide_layouts[CONTENT_LAYOUT]
+    else:
+        prs = new_presentation()
+        title_layout = content_layout = None
+
+    for slide in slides:
+
+        create_title_slide(
+            prs,
+            title=slide.get("title", "Presentation"),
+            subtitle=slide.get("subtitle", ""),
+            author=slide.get("author", ""),
+            layout=title_layout
+        )
+
+        create_elegant_slide(prs, slide, images.get(slide.get("image")), layout=content_layout)
+
+    return prs
+
+
+def presentation_bytes(prs):
+    buffer = io.BytesIO()
+    prs.save(buffer)
+    return buffer.getvalue()
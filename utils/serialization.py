@@ -0,0 +1,52 @@
+import orjson
+from fastapi import Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+
+class FastJSONResponse(JSONResponse):
+    # returning this directly skips fastapi's jsonable_encoder walk over the whole deck
+    def render(self, content):
+        if isinstance(content, BaseModel):
+            content = content.model_dump()
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+async def decode_body(request:Request, adapter:TypeAdapter):
+    body = await request.body()
+    try:
+        data = orjson.loads(body)
+    except orjson.JSONDecodeError as e:
+        raise RequestValidationError([{
+            "type": "json_invalid", "loc": ("body", e.pos), "msg": "JSON decode error",
+            "input": {}, "ctx": {"error": e.msg},
+        }])
+    try:
+        return adapter.validate_python(data)
+    except ValidationError as e:
+        raise RequestValidationError([{**error, "loc": ("body", *error["loc"])} for error in e.errors()])
+
+
+def body_schema(adapter:TypeAdapter):
+    # bodies read through decode_body are invisible to fastapi, so routes declare them with openapi_extra;
+    # $defs are inlined because "#/$defs/..." would resolve against the openapi document root
+    schema = adapter.json_schema()
+    defs = schema.pop("$defs", {})
+
+    def inline(node):
+        if isinstance(node, dict):
+            ref = node.get("$ref")
+            if ref is not None and ref.startswith("#/$defs/"):
+                return inline(defs[ref[len("#/$defs/"):]])
+            return {key: inline(value) for key, value in node.items()}
+        if isinstance(node, list):
+            return [inline(value) for value in node]
+        return node
+
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": inline(schema)}},
+        }
+    }
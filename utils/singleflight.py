@@ -0,0 +1,28 @@
+import asyncio
+
+
+class SingleFlight:
+    def __init__(self):
+        self._flights = {}
+
+    async def do(self, key, factory):
+        task = self._flights.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._flights[key] = task
+            task.add_done_callback(lambda done, key=key: self._forget(key, done))
+        # shield so a cancelled waiter does not cancel the call other waiters share
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        if self._flights.get(key) is task:
+            del self._flights[key]
+        if not task.cancelled():
+            # mark the exception as retrieved when every waiter has gone away
+            task.exception()
+
+    def in_flight(self):
+        return len(self._flights)
+
+
+deck_flights = SingleFlight()